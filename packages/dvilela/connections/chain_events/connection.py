@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Chain events connection."""
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import websockets
+from aea.configurations.base import PublicId
+from aea.connections.base import BaseSyncConnection
+from aea.mail.base import Envelope
+from aea_ledger_ethereum import EthereumApi
+from hexbytes import HexBytes
+from web3 import Web3
+
+from packages.dvilela.contracts.olas_events.contract import (
+    EVENT_ABIS,
+    OlasEventsContract,
+)
+from packages.dvilela.contracts.olas_events.index import (
+    commit_window,
+    get_checkpoints,
+    get_tracked_events,
+    init_index,
+    remove_events,
+    set_stream_head,
+)
+from packages.dvilela.contracts.olas_events.scanner import (
+    EventRecord,
+    build_log_filter,
+    decode_logs,
+    get_event_scanner,
+    scan_events,
+)
+
+
+PUBLIC_ID = PublicId.from_str("dvilela/chain_events:0.1.0")
+
+RECEIVE_TIMEOUT_SECONDS = 1.0
+RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 60.0
+
+
+def format_log(log: Dict) -> Dict:
+    """Format a raw JSON-RPC log the way web3 returns them"""
+    return {
+        **log,
+        "address": Web3.to_checksum_address(log["address"]),
+        "topics": [HexBytes(topic) for topic in log["topics"]],
+        "data": HexBytes(log["data"]),
+        "blockNumber": int(log["blockNumber"], 16),
+        "transactionHash": HexBytes(log["transactionHash"]),
+        "logIndex": int(log["logIndex"], 16),
+    }
+
+
+class ChainEventStream:  # pylint: disable=too-many-instance-attributes
+    """
+    A log subscription for the tracked contracts of a chain.
+
+    The subscribed events are buffered and committed to the event index every time a
+    new block arrives, together with the checkpoints of every tracked event and the
+    stream head, so the skill can drain the index without querying the RPC.
+
+    After every (re)connection, the blocks between the checkpoints and the first new
+    block are range scanned before any checkpoint is moved, so no events are missed.
+
+    The tracked contracts and events are the ones the skill records in the index with
+    its range scans, and the subscription is renewed whenever they change.
+    """
+
+    def __init__(
+        self,
+        chain_name: str,
+        ws_url: str,
+        rpc_url: str,
+        logger: logging.Logger,
+    ) -> None:
+        """Init"""
+        self.chain_name = chain_name
+        self.ws_url = ws_url
+        self.ledger_api = EthereumApi(address=rpc_url)
+        self.logger = logger
+        self.contracts: Dict[str, List[str]] = {}
+        self.tracked_events: List[Tuple[str, str]] = []
+        self.scanners: List = []
+        self.address_to_events: Dict = {}
+        self.topics: List = []
+
+        # Events received but not committed yet, and the block until which the index is complete
+        self.pending: List[EventRecord] = []
+        self.synced_block: Optional[int] = None
+        self.gap_fill: Optional[asyncio.Future] = None
+
+    def load_tracked_events(self) -> bool:
+        """Load the contracts and events tracked by the skill from the index. Returns whether they changed."""
+        contracts = get_tracked_events(self.chain_name)
+        if contracts == self.contracts:
+            return False
+
+        self.contracts = contracts
+        self.tracked_events = [
+            (address, event_name)
+            for address, event_names in contracts.items()
+            for event_name in event_names
+        ]
+        self.scanners = [
+            (
+                get_event_scanner(
+                    str(OlasEventsContract.contract_id),
+                    self.chain_name,
+                    address,
+                    EVENT_ABIS[self.chain_name],
+                ),
+                event_names,
+            )
+            for address, event_names in contracts.items()
+        ]
+        self.address_to_events, self.topics = build_log_filter(self.scanners)
+        return True
+
+    def fill_gap(self, from_block: int, to_block: int) -> Optional[int]:
+        """Range scan the blocks the subscription missed. The checkpoints move with every window."""
+        self.logger.info(
+            f"Filling the {self.chain_name} event gap from block {from_block} to {to_block}"
+        )
+        result = scan_events(
+            self.ledger_api,
+            self.chain_name,
+            self.scanners,
+            from_block,
+            to_block,
+            on_events=lambda start, end, events: commit_window(
+                self.chain_name, events, self.tracked_events, end
+            ),
+        )
+
+        # The next block resumes the scan from the checkpoints
+        if "error" in result:
+            self.logger.error(
+                f"Error filling the {self.chain_name} event gap: {result['error']}"
+            )
+            return None
+
+        return to_block
+
+    def on_logs(self, logs: List[Dict]) -> None:
+        """Buffer the events of new logs, and drop the ones removed by a reorg"""
+        removed = {
+            (
+                int(log["blockNumber"], 16),
+                Web3.to_hex(HexBytes(log["transactionHash"])),
+                int(log["logIndex"], 16),
+            )
+            for log in logs
+            if log.get("removed")
+        }
+        if removed:
+            self.logger.warning(
+                f"Logs removed by a reorg on {self.chain_name}: {removed}"
+            )
+            self.pending = [
+                event
+                for event in self.pending
+                if (event.block_number, event.transaction_hash, event.log_index)
+                not in removed
+            ]
+            # The previous blocks are already committed
+            remove_events(self.chain_name, list(removed))
+        self.pending.extend(
+            decode_logs(
+                self.ledger_api.api.codec,
+                self.address_to_events,
+                [format_log(log) for log in logs if not log.get("removed")],
+            )
+        )
+
+    def on_head(self, block_number: int) -> bool:
+        """Commit the events of the previous blocks once a new block arrives. Returns False to renew the subscription."""
+
+        # The skill changed its tracked contracts or events. They are reloaded once the gap fill is done.
+        if get_tracked_events(self.chain_name) != self.contracts:
+            self.logger.info(
+                f"The tracked events on {self.chain_name} changed. Renewing the subscription..."
+            )
+            return False
+
+        if self.gap_fill is not None and self.gap_fill.done():
+            self.synced_block = self.gap_fill.result()
+            self.gap_fill = None
+
+        if self.synced_block is None:
+            if self.gap_fill is None:
+                self.start_gap_fill(block_number - 1)
+            return True
+
+        # Logs are sent before the next head, so the previous blocks are complete
+        committed_block = max(block_number - 1, self.synced_block)
+        events = [e for e in self.pending if e.block_number <= committed_block]
+        self.pending = [e for e in self.pending if e.block_number > committed_block]
+        commit_window(self.chain_name, events, self.tracked_events, committed_block)
+        set_stream_head(self.chain_name, committed_block)
+        if events:
+            self.logger.info(
+                f"Indexed {len(events)} streamed events on {self.chain_name} until block {committed_block}"
+            )
+        return True
+
+    def start_gap_fill(self, to_block: int) -> None:
+        """Start range scanning from the checkpoints, once every tracked event has one"""
+        checkpoints = get_checkpoints(self.chain_name, self.tracked_events)
+
+        # The skill sets the initial blocks. Wait for its first range scan.
+        if len(checkpoints) < len(self.tracked_events):
+            return
+
+        from_block = min(checkpoints.values()) + 1
+        if from_block > to_block:
+            self.synced_block = to_block
+            return
+
+        self.gap_fill = asyncio.get_running_loop().run_in_executor(
+            None, self.fill_gap, from_block, to_block
+        )
+
+    async def run(self, is_running: Callable[[], bool]) -> None:
+        """Keep the subscription open, reconnecting after any failure"""
+        delay = RECONNECT_DELAY_SECONDS
+        while is_running():
+            try:
+                await self.stream(is_running)
+                delay = RECONNECT_DELAY_SECONDS
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error(
+                    f"Log subscription on {self.chain_name} failed: {e}. Reconnecting in {delay}s..."
+                )
+
+            # The events received since the last head are committed by the next gap fill
+            self.pending = []
+            self.synced_block = None
+            if self.gap_fill is not None:
+                await asyncio.wait([self.gap_fill])
+                self.gap_fill = None
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    async def stream(self, is_running: Callable[[], bool]) -> None:
+        """Subscribe to the tracked logs and the new blocks, and process them"""
+        # The skill records the tracked events with its first range scan
+        self.load_tracked_events()
+        if not self.tracked_events:
+            return
+
+        async with websockets.connect(self.ws_url) as ws:
+            requests = {
+                1: (
+                    "logs",
+                    {"address": list(self.address_to_events), "topics": [self.topics]},
+                ),
+                2: ("newHeads",),
+            }
+            for request_id, params in requests.items():
+                await ws.send(
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": request_id,
+                            "method": "eth_subscribe",
+                            "params": params,
+                        }
+                    )
+                )
+            self.logger.info(
+                f"Subscribed to the {self.chain_name} logs at {self.ws_url}"
+            )
+
+            subscriptions: Dict[str, str] = {}
+            while is_running():
+                try:
+                    message = json.loads(
+                        await asyncio.wait_for(ws.recv(), RECEIVE_TIMEOUT_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    continue
+
+                # Subscription responses
+                if "id" in message:
+                    if "error" in message:
+                        raise ValueError(message["error"])
+                    subscriptions[message["result"]] = requests[message["id"]][0]
+                    continue
+
+                params = message.get("params", {})
+                kind = subscriptions.get(params.get("subscription"))
+                result = params.get("result")
+                if kind == "logs":
+                    self.on_logs(result if isinstance(result, list) else [result])
+                elif kind == "newHeads" and not self.on_head(int(result["number"], 16)):
+                    return
+
+
+class ChainEventsConnection(BaseSyncConnection):
+    """Keeps the event index up to date with websocket log subscriptions."""
+
+    MAX_WORKER_THREADS = 2
+
+    connection_id = PUBLIC_ID
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:  # pragma: no cover
+        """
+        Initialize the connection.
+
+        The configuration must be specified if and only if the following
+        parameters are None: connection_id, excluded_protocols or restricted_to_protocols.
+
+        Possible arguments:
+        - configuration: the connection configuration.
+        - data_dir: directory where to put local files.
+        - identity: the identity object held by the agent.
+        - crypto_store: the crypto store for encrypted communication.
+        - restricted_to_protocols: the set of protocols ids of the only supported protocols for this connection.
+        - excluded_protocols: the set of protocols ids that we want to exclude for this connection.
+
+        :param args: arguments passed to component base
+        :param kwargs: keyword arguments passed to component base
+        """
+        super().__init__(*args, **kwargs)
+        config = self.configuration.config
+        self.index_path = config.get("index_path")
+        ws_urls = config.get("ws_urls") or {}
+        rpc_urls = config.get("rpc_urls") or {}
+
+        # Chains without a websocket url are not streamed. The skill range scans them.
+        self.streams = [
+            ChainEventStream(
+                chain_name,
+                ws_url,
+                rpc_urls[chain_name],
+                self.logger,
+            )
+            for chain_name, ws_url in ws_urls.items()
+            if ws_url
+        ]
+
+    def main(self) -> None:
+        """Run the log subscriptions until the connection is closed."""
+        if not self.streams:
+            return
+
+        async def _run() -> None:
+            await asyncio.gather(
+                *(stream.run(lambda: self.is_connected) for stream in self.streams)
+            )
+
+        asyncio.run(_run())
+
+    def on_send(self, envelope: Envelope) -> None:
+        """
+        Send an envelope.
+
+        :param envelope: the envelope to send.
+        """
+        self.logger.error(
+            f"The chain events connection does not handle messages: {envelope}"
+        )
+
+    def on_connect(self) -> None:
+        """Set up the connection"""
+        if self.streams:
+            init_index(self.index_path)
+            self.logger.info(
+                f"Streaming events for {[s.chain_name for s in self.streams]} into {self.index_path}"
+            )
+
+    def on_disconnect(self) -> None:
+        """
+        Tear down the connection.
+
+        Connection status set automatically.
+        """
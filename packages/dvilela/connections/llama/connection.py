@@ -21,14 +21,21 @@
 """Llama connection."""
 
 import json
-from typing import Any, Dict, Tuple, cast
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 from aea.configurations.base import PublicId
 from aea.connections.base import BaseSyncConnection
 from aea.mail.base import Envelope
 from aea.protocols.base import Address, Message
 from aea.protocols.dialogue.base import Dialogue
-from llama_cpp import Llama
+from llama_cpp import Llama, llama_token_get_text
+from llama_cpp.llama import LlamaState
+from llama_cpp.llama_chat_format import Jinja2ChatFormatter
 
 from packages.valory.protocols.srr.dialogues import SrrDialogue
 from packages.valory.protocols.srr.dialogues import SrrDialogues as BaseSrrDialogues
@@ -38,6 +45,41 @@ from packages.valory.protocols.srr.message import SrrMessage
 PUBLIC_ID = PublicId.from_str("dvilela/llama:0.1.0")
 
 DEFAULT_TEMPERATURE = 0.8
+DEFAULT_PROMPT_CACHE_SIZE = 1
+USER_PROMPT_MARK = "<<user prompt>>"
+DEFAULT_CHARS_PER_TOKEN = 4.0
+CHARS_PER_TOKEN_SMOOTHING = 0.1
+MAX_TOKENS_MARGIN = 1.25
+SENTENCE_END_REGEX = r"[.!?](?=\s|$)"
+
+
+def fit_to_budget(text: str, max_chars: int, complete: bool = True) -> Tuple[str, bool]:
+    """Trim a text to its last full sentence within max_chars. Returns the text and whether it was trimmed."""
+    text = text.strip()
+
+    # Incomplete texts end mid-sentence, so they are trimmed even if they fit
+    if complete and len(text) <= max_chars:
+        return text, False
+
+    # Sentences that end right at the budget are kept too
+    ends = [
+        match.end()
+        for match in re.finditer(SENTENCE_END_REGEX, text[: max_chars + 1])
+        if match.end() <= max_chars
+    ]
+    if not ends:
+        return text, False
+
+    return text[: ends[-1]], True
+
+
+class ModelStatus:  # pylint: disable=too-few-public-methods
+    """Readiness states of the Llama model."""
+
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
 
 
 class SrrDialogues(BaseSrrDialogues):
@@ -69,7 +111,9 @@ class SrrDialogues(BaseSrrDialogues):
         )
 
 
-class LlamaConnection(BaseSyncConnection):
+class LlamaConnection(
+    BaseSyncConnection
+):  # pylint: disable=too-many-instance-attributes
     """Proxy to the functionality of the Llama-cpp-python library."""
 
     MAX_WORKER_THREADS = 1
@@ -95,18 +139,33 @@ class LlamaConnection(BaseSyncConnection):
         :param kwargs: keyword arguments passed to component base
         """
         super().__init__(*args, **kwargs)
-        repo_id = self.configuration.config.get(
+        self.repo_id = self.configuration.config.get(
             "repo_id", "QuantFactory/Meta-Llama-3-8B-Instruct-GGUF"
         )
-        filename = self.configuration.config.get("filename", "*Q4_0.gguf")
-        self.logger.info(
-            f"Downloading LLM model {repo_id} [{filename}]. This might take a few minutes..."
-        )
-        self.llm = Llama.from_pretrained(
-            repo_id=repo_id,
-            filename=filename,
-            verbose=False,
+        self.filename = self.configuration.config.get("filename", "*Q4_0.gguf")
+        self.model_path = self.configuration.config.get("model_path")
+
+        # The model is loaded in the background, so the agent does not wait for it to start
+        self.llm: Optional[Llama] = None
+        self.status = ModelStatus.PENDING
+        self.load_error: Optional[str] = None
+        self._ready = threading.Event()
+        self._loader: Optional[threading.Thread] = None
+
+        # Model states right after evaluating a system prompt, by system prompt. Llama reuses the
+        # longest common token prefix between the loaded state and a new prompt, so restoring the
+        # state of the same system prompt only leaves the user prompt to be evaluated.
+        # Every state holds a copy of the logits, so only a few of them are kept.
+        self.prompt_cache_size = int(
+            self.configuration.config.get(
+                "prompt_cache_size", DEFAULT_PROMPT_CACHE_SIZE
+            )
         )
+        self.prompt_states: OrderedDict[str, LlamaState] = OrderedDict()
+        self.loaded_system_prompt: Optional[str] = None
+
+        # Observed characters per generated token, to turn character budgets into max_tokens
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN
 
         self.dialogues = SrrDialogues(connection_id=PUBLIC_ID)
 
@@ -151,6 +210,14 @@ class LlamaConnection(BaseSyncConnection):
             )
             return
 
+        # Requests that arrive while the model is loading wait for it here.
+        # The connection runs a single worker, so the ones after them stay queued in order.
+        if not self._ready.is_set():
+            self.logger.info(
+                f"Llama model is {self.status}. Queueing the request until it is ready..."
+            )
+            self._ready.wait()
+
         payload, error = self._get_response(
             payload=json.loads(srr_message.payload),
         )
@@ -175,7 +242,50 @@ class LlamaConnection(BaseSyncConnection):
         self.put_envelope(response_envelope)
 
     def _get_response(self, payload: dict) -> Tuple[Dict, bool]:
-        """Get response from Llama."""
+        """Get response from Llama, for a single request or a batch of them."""
+
+        if "requests" not in payload:
+            return self._get_completion(payload)
+
+        requests = payload["requests"]
+        if not isinstance(requests, list):
+            return {
+                "error": f"The batch requests must be a list, got {type(requests).__name__}"
+            }, True
+
+        # Invalid requests get their own error, the rest of the batch still runs
+        responses: List[Dict] = [
+            (
+                {}
+                if isinstance(request, dict)
+                else {
+                    "error": f"The batch request must be a dict, got {type(request).__name__}"
+                }
+            )
+            for request in requests
+        ]
+
+        # Requests that share a system prompt go one after the other, so the cached
+        # prompt state is restored once per system prompt. Responses keep the request order.
+        order = sorted(
+            (i for i, response in enumerate(responses) if not response),
+            key=lambda i: str(requests[i].get("system")),
+        )
+        self.logger.info(
+            f"Calling chat completion for a batch of {len(requests)} requests"
+        )
+        for i in order:
+            responses[i], _ = self._get_completion(requests[i])
+
+        # An empty batch is not an error
+        return {"responses": responses}, bool(responses) and all(
+            "error" in r for r in responses
+        )
+
+    def _get_completion(  # pylint: disable=too-many-locals
+        self, payload: dict
+    ) -> Tuple[Dict, bool]:
+        """Get a chat completion from Llama."""
 
         REQUIRED_PROPERTIES = ["system", "user"]
 
@@ -184,28 +294,169 @@ class LlamaConnection(BaseSyncConnection):
                 "error": f"Some parameter is missing from the request data: required={REQUIRED_PROPERTIES}, got={list(payload.keys())}"
             }, True
 
+        if self.llm is None:
+            return {
+                "error": f"Llama model is not available [{self.status}]: {self.load_error}"
+            }, True
+
         self.logger.info(f"Calling chat completion: {payload}")
 
+        # A character budget caps the generation a bit above the tokens it should take,
+        # so the answer can still finish its sentence before being trimmed
+        max_chars = payload.get("max_chars")
+        max_tokens = payload.get("max_tokens")
+        if max_chars is not None and max_tokens is None:
+            max_tokens = math.ceil(
+                int(max_chars) / self.chars_per_token * MAX_TOKENS_MARGIN
+            )
+
+        # Tokens are streamed, so the generation can stop as soon as the text cannot fit
+        text = ""
+        n_tokens = 0
+        finish_reason = None
+        too_long = False
         try:
-            response = self.llm.create_chat_completion(
+            self.load_system_prompt(payload["system"])
+            stream = self.llm.create_chat_completion(
                 messages=[
                     {"role": "system", "content": payload["system"]},  # type: ignore
                     {"role": "user", "content": payload["user"]},  # type: ignore
                 ],
                 temperature=float(payload.get("temperature", DEFAULT_TEMPERATURE)),
+                max_tokens=max_tokens,
+                stream=True,
             )
-            self.logger.info(f"LLM response: {response}")
+            for chunk in stream:  # type: ignore
+                choice = chunk["choices"][0]
+                content = choice["delta"].get("content")
+                if content:
+                    text += content
+                    n_tokens += 1
+                finish_reason = choice["finish_reason"] or finish_reason
+                if max_chars is not None and len(text.strip()) > int(max_chars):
+                    too_long = True
+                    stream.close()  # type: ignore
+                    break
+            self.logger.info(
+                f"LLM response [{finish_reason or 'aborted'}, {n_tokens} tokens]: {text}"
+            )
+            self.loaded_system_prompt = payload["system"]
         except Exception as e:
+            self.loaded_system_prompt = None
             return {"error": f"Exception while calling Llama:\n{e}"}, True
 
-        return {"response": response["choices"][0]["message"]["content"]}, False  # type: ignore
+        # Answers cut by the token limit have all their tokens too
+        if finish_reason in ("stop", "length"):
+            self.record_chars_per_token(text, n_tokens)
 
-    def on_connect(self) -> None:
-        """
-        Tear down the connection.
+        if max_chars is None:
+            return {"response": text}, False
 
-        Connection status set automatically.
-        """
+        # Answers that were aborted or hit the token limit keep their full sentences, if any fit in the budget
+        cut = too_long or finish_reason == "length"
+        text, truncated = fit_to_budget(text, int(max_chars), complete=not cut)
+        if cut and not truncated:
+            self.logger.info("LLM response can not fit the budget. Aborted early.")
+            return {"response": text, "too_long": True}, False
+
+        return {"response": text, "truncated": truncated}, False
+
+    def record_chars_per_token(self, text: str, n_tokens: int) -> None:
+        """Update the average number of characters per generated token"""
+        if not text or n_tokens <= 0:
+            return
+        self.chars_per_token += CHARS_PER_TOKEN_SMOOTHING * (
+            len(text) / n_tokens - self.chars_per_token
+        )
+
+    def load_system_prompt(self, system_prompt: str) -> None:
+        """Restore the cached state of a system prompt, or evaluate the system prompt and cache its state"""
+        llm = cast(Llama, self.llm)
+        if system_prompt == self.loaded_system_prompt:
+            return
+
+        if system_prompt in self.prompt_states:
+            self.prompt_states.move_to_end(system_prompt)
+            llm.load_state(self.prompt_states[system_prompt])
+            self.loaded_system_prompt = system_prompt
+            self.logger.info(
+                f"Restored the cached state of the system prompt [{llm.n_tokens} tokens]"
+            )
+            return
+
+        prefix = self.get_system_prefix(system_prompt)
+        if self.prompt_cache_size <= 0 or prefix is None:
+            self.logger.info("System prompt is not cached. Evaluating it in full...")
+            return
+
+        # The state is saved before any generation, so it only holds the system prompt
+        llm.reset()
+        llm.eval(llm.tokenize(prefix.encode("utf-8"), special=True))
+        self.prompt_states[system_prompt] = llm.save_state()
+        self.loaded_system_prompt = system_prompt
+        while len(self.prompt_states) > self.prompt_cache_size:
+            self.prompt_states.popitem(last=False)
+        self.logger.info(
+            f"Cached the state of the system prompt [{llm.n_tokens} tokens]"
+        )
+
+    def get_system_prefix(self, system_prompt: str) -> Optional[str]:
+        """Get the start of the chat prompt that every request with this system prompt shares"""
+        llm = cast(Llama, self.llm)
+        template = llm.metadata.get("tokenizer.chat_template")
+        if template is None:
+            return None
+
+        # Same formatter that Llama builds from the model chat template
+        formatter = Jinja2ChatFormatter(
+            template=template,
+            eos_token=llama_token_get_text(llm.model, llm.token_eos()).decode("utf-8"),
+            bos_token=llama_token_get_text(llm.model, llm.token_bos()).decode("utf-8"),
+        )
+        prompt = formatter(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": USER_PROMPT_MARK},
+            ]
+        ).prompt
+        prefix, mark, _ = prompt.partition(USER_PROMPT_MARK)
+        return prefix if mark else None
+
+    def load_model(self) -> None:
+        """Load the model from the local path if there is one, or from the Hugging Face hub"""
+        self.status = ModelStatus.LOADING
+        start_time = time.monotonic()
+        try:
+            if self.model_path:
+                self.logger.info(f"Loading LLM model from {self.model_path}...")
+                self.llm = Llama(model_path=self.model_path, verbose=False)
+            else:
+                self.logger.info(
+                    f"Downloading LLM model {self.repo_id} [{self.filename}]. This might take a few minutes..."
+                )
+                self.llm = Llama.from_pretrained(
+                    repo_id=self.repo_id,
+                    filename=self.filename,
+                    verbose=False,
+                )
+            self.status = ModelStatus.READY
+            self.logger.info(
+                f"LLM model loaded in {time.monotonic() - start_time:.1f} seconds"
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            self.status = ModelStatus.FAILED
+            self.load_error = str(e)
+            self.logger.error(f"Error while loading the LLM model: {e}")
+        finally:
+            self._ready.set()
+
+    def on_connect(self) -> None:
+        """Start loading the model in the background"""
+        if self._loader is None:
+            self._loader = threading.Thread(
+                target=self.load_model, name="llama_loader", daemon=True
+            )
+            self._loader.start()
 
     def on_disconnect(self) -> None:
         """
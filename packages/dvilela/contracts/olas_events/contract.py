@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the class to sweep the events of all the tracked Olas contracts."""
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from aea.common import JSONLike
+from aea.configurations.base import PublicId
+from aea.contracts.base import Contract
+from aea_ledger_ethereum import EthereumApi
+from web3 import Web3
+
+from packages.dvilela.contracts.olas_events.index import (
+    commit_window,
+    get_checkpoints,
+    get_stream_head,
+    init_index,
+    mark_processed,
+    query_events,
+    set_tracked_events,
+)
+from packages.dvilela.contracts.olas_events.rpc_pool import get_rpc_pool
+from packages.dvilela.contracts.olas_events.scanner import (
+    get_event_scanner,
+    pack_events,
+    scan_events,
+)
+
+
+PUBLIC_ID = PublicId.from_str("dvilela/olas_events:0.1.0")
+
+_logger = logging.getLogger(
+    f"aea.packages.{PUBLIC_ID.author}.contracts.{PUBLIC_ID.name}.contract"
+)
+
+BUILD_PATH = Path(__file__).parent / "build" / "olas_events.json"
+
+with open(BUILD_PATH, "r", encoding="utf-8") as build_file:
+    ETHEREUM_EVENT_ABIS = json.load(build_file)["abi"]
+
+EVENT_ABIS = {
+    "ethereum": ETHEREUM_EVENT_ABIS,
+    "gnosis": [
+        {
+            "anonymous": False,
+            "inputs": [
+                {
+                    "indexed": True,
+                    "internalType": "uint256",
+                    "name": "serviceId",
+                    "type": "uint256",
+                },
+                {
+                    "indexed": False,
+                    "internalType": "bytes32",
+                    "name": "configHash",
+                    "type": "bytes32",
+                },
+            ],
+            "name": "CreateService",
+            "type": "event",
+        },
+    ],
+}
+
+
+# pylint: disable=too-many-arguments,invalid-name
+class OlasEventsContract(Contract):
+    """The olas events contract."""
+
+    contract_id = PUBLIC_ID
+
+    @classmethod
+    def get_events(  # pylint: disable=unused-argument,too-many-locals
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        contracts: Dict[str, List[str]],
+        from_block: int,
+        to_block: Union[int, str] = "latest",
+        chain_name: str = "ethereum",
+        index_path: Optional[str] = None,
+        fields: Optional[Dict[str, List[str]]] = None,
+        stream_max_age: Optional[float] = None,
+        rpc_urls: Optional[List[str]] = None,
+        rpc_limits: Optional[Dict[str, Any]] = None,
+    ) -> Optional[JSONLike]:
+        """
+        Get the events from several contracts at once.
+
+        A single log query per block window covers every tracked address and event topic.
+        The logs are then routed back to their event abi and decoded.
+
+        If an index is used, the events of every window are appended to it as soon as
+        the window is fetched, together with a checkpoint per contract and event, and
+        all the events that have not been processed yet are returned, including the
+        ones from previous scans. The scan resumes from the oldest checkpoint. The tracked
+        contracts and events are recorded in the index as well, so the chain_events
+        connection subscribes to the same ones.
+
+        The events are packed into a compact payload that only carries the arguments
+        the caller asked for. Use scanner.unpack_events to read them.
+
+        If a log subscription (the chain_events connection) keeps the index up to date,
+        the RPC is not queried at all while its latest block is recent enough. Otherwise,
+        the blocks the subscription missed are range scanned as usual.
+
+        The block windows are spread across the ledger api RPC and the extra rpc_urls,
+        picking the fastest healthy endpoint for every request and failing over to the others.
+
+        :param ledger_api: the ledger api.
+        :param contract_address: any of the tracked addresses. Unused, the sweep uses the contracts mapping.
+        :param contracts: a mapping from contract address to the list of tracked event names.
+        :param from_block: the first block to scan (inclusive).
+        :param to_block: the last block to scan (inclusive).
+        :param chain_name: the chain name.
+        :param index_path: the path to the event index database, if any.
+        :param fields: the arguments to return per event name. Events not listed return all of them.
+        :param stream_max_age: the seconds after which the log subscription is considered down, if any.
+        :param rpc_urls: extra RPC endpoints for the chain, if any.
+        :param rpc_limits: the requests_per_second, requests_per_period and current period, if any. The scan stops when the period budget is spent.
+        :return: the packed events sorted by block and log index, the latest scanned block and an error, if any.
+        """
+        tracked_events = [
+            (Web3.to_checksum_address(address), event_name)
+            for address, event_names in contracts.items()
+            for event_name in event_names
+        ]
+
+        # Resume from the oldest checkpoint. Contracts and events without one start at from_block.
+        if index_path:
+            init_index(index_path)
+            set_tracked_events(chain_name, tracked_events)
+            checkpoints = get_checkpoints(chain_name, tracked_events)
+            from_block = min(
+                checkpoints.get(tracked_event, from_block - 1) + 1
+                for tracked_event in tracked_events
+            )
+
+            # Every tracked event is already indexed up to the subscription head
+            stream_head = (
+                get_stream_head(chain_name, stream_max_age)
+                if stream_max_age is not None
+                else None
+            )
+            if stream_head is not None and from_block > stream_head:
+                return dict(
+                    events=pack_events(
+                        query_events(
+                            chain_name, processed=False, tracked_events=tracked_events
+                        ),
+                        fields,
+                    ),
+                    latest_block=from_block - 1,
+                )
+
+        result = scan_events(
+            ledger_api,
+            chain_name,
+            [
+                (
+                    get_event_scanner(
+                        str(cls.contract_id),
+                        chain_name,
+                        address,
+                        EVENT_ABIS[chain_name],
+                    ),
+                    event_names,
+                )
+                for address, event_names in contracts.items()
+            ],
+            from_block,
+            to_block,
+            on_events=(
+                (
+                    lambda start, end, events: commit_window(
+                        chain_name, events, tracked_events, end
+                    )
+                )
+                if index_path
+                else None
+            ),
+            rpc_pool=get_rpc_pool(ledger_api, chain_name, rpc_urls, rpc_limits),
+        )
+
+        if index_path:
+            # Other consumers of the index may track more contracts or events
+            result["events"] = query_events(
+                chain_name, processed=False, tracked_events=tracked_events
+            )
+
+        result["events"] = pack_events(result["events"], fields)
+
+        return result
+
+    @classmethod
+    def get_latest_block(  # pylint: disable=unused-argument
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        chain_name: str = "ethereum",
+        rpc_urls: Optional[List[str]] = None,
+        rpc_limits: Optional[Dict[str, Any]] = None,
+    ) -> Optional[JSONLike]:
+        """Get the latest block number from the fastest healthy RPC endpoint of a chain."""
+        rpc_pool = get_rpc_pool(ledger_api, chain_name, rpc_urls, rpc_limits)
+        return dict(
+            latest_block=rpc_pool.call(lambda api: api.api.eth.get_block_number())
+        )
+
+    @classmethod
+    def get_rpc_health(  # pylint: disable=unused-argument
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        chain_name: str = "ethereum",
+        rpc_urls: Optional[List[str]] = None,
+    ) -> Optional[JSONLike]:
+        """Get the latency, error rate and circuit state of every RPC endpoint of a chain, and its request limiter."""
+        return get_rpc_pool(ledger_api, chain_name, rpc_urls).to_dict()
+
+    @classmethod
+    def get_indexed_events(  # pylint: disable=unused-argument
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        index_path: str,
+        chain_name: str = "ethereum",
+        processed: Optional[bool] = None,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        address: Optional[str] = None,
+        event: Optional[str] = None,
+        fields: Optional[Dict[str, List[str]]] = None,
+    ) -> Optional[JSONLike]:
+        """Get past events from the index, without querying the RPC."""
+        init_index(index_path)
+        return dict(
+            events=pack_events(
+                query_events(
+                    chain_name, processed, from_block, to_block, address, event
+                ),
+                fields,
+            )
+        )
+
+    @classmethod
+    def mark_events_processed(  # pylint: disable=unused-argument
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        index_path: str,
+        event_keys: List[Tuple[int, str, int]],
+        chain_name: str = "ethereum",
+    ) -> Optional[JSONLike]:
+        """Mark indexed events, given their block number, transaction hash and log index, as processed."""
+        init_index(index_path)
+        return dict(processed=mark_processed(chain_name, event_keys))
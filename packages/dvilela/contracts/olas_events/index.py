@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the local index of the scanned Olas events."""
+
+import json
+import operator
+import threading
+import time
+from functools import reduce
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from peewee import (
+    BooleanField,
+    CharField,
+    CompositeKey,
+    EXCLUDED,
+    FloatField,
+    IntegerField,
+    Model,
+    SqliteDatabase,
+    TextField,
+    Value,
+    fn,
+)
+from web3 import Web3
+
+from packages.dvilela.contracts.olas_events.scanner import EventRecord
+
+
+db = SqliteDatabase(None)
+
+
+class BaseModel(Model):
+    """Database base model"""
+
+    class Meta:  # noqa pylint: disable=too-few-public-methods
+        """Database meta model, as required per peewee"""
+
+        database = db  # noqa: F841
+
+
+class IndexedEvent(BaseModel):
+    """Database table of decoded events"""
+
+    chain = CharField()
+    block_number = IntegerField()
+    transaction_hash = CharField()
+    log_index = IntegerField()
+    address = CharField(index=True)
+    event = CharField(index=True)
+    data = TextField()
+    processed = BooleanField(default=False, index=True)
+
+    class Meta:  # noqa pylint: disable=too-few-public-methods
+        """Events are unique per chain, block, transaction and log index"""
+
+        primary_key = CompositeKey(
+            "chain", "block_number", "transaction_hash", "log_index"
+        )
+
+
+class Checkpoint(BaseModel):
+    """Database table of the latest scanned block per chain, contract and event"""
+
+    chain = CharField()
+    address = CharField()
+    event = CharField()
+    block_number = IntegerField()
+
+    class Meta:  # noqa pylint: disable=too-few-public-methods
+        """There is one checkpoint per chain, contract and event"""
+
+        primary_key = CompositeKey("chain", "address", "event")
+
+
+class TrackedEvent(BaseModel):
+    """Database table of the contract addresses and events the skill tracks, per chain"""
+
+    chain = CharField()
+    address = CharField()
+    event = CharField()
+
+    class Meta:  # noqa pylint: disable=too-few-public-methods
+        """Every contract and event is tracked once per chain"""
+
+        primary_key = CompositeKey("chain", "address", "event")
+
+
+class StreamHead(BaseModel):
+    """Database table of the latest block committed by a log subscription, per chain"""
+
+    chain = CharField(primary_key=True)
+    block_number = IntegerField()
+    timestamp = FloatField()
+
+
+_db_path: Optional[str] = None
+_db_lock = threading.Lock()
+
+
+def init_index(db_path: str) -> None:
+    """Open the index database and create its tables, once per path"""
+    global _db_path  # pylint: disable=global-statement
+    with _db_lock:
+        if _db_path == db_path:
+            return
+        db.init(db_path, pragmas={"journal_mode": "wal"})
+        db.create_tables(
+            [IndexedEvent, Checkpoint, TrackedEvent, StreamHead], safe=True
+        )
+        _db_path = db_path
+
+
+def _append_events(
+    chain: str, events: List[EventRecord], processed: bool = False
+) -> None:
+    """Add events to the index. Events that are already indexed are ignored."""
+    rows = [
+        {
+            "chain": chain,
+            "block_number": event.block_number,
+            "transaction_hash": event.transaction_hash,
+            "log_index": event.log_index,
+            "address": event.address,
+            "event": event.event,
+            "data": json.dumps(event.args),
+            "processed": processed,
+        }
+        for event in events
+    ]
+    if rows:
+        IndexedEvent.insert_many(rows).on_conflict_ignore().execute()
+
+
+def query_events(  # pylint: disable=too-many-arguments
+    chain: str,
+    processed: Optional[bool] = None,
+    from_block: Optional[int] = None,
+    to_block: Optional[int] = None,
+    address: Optional[str] = None,
+    event: Optional[str] = None,
+    tracked_events: Optional[Iterable[Tuple[str, str]]] = None,
+) -> List[EventRecord]:
+    """Get the indexed events that match the filters, in block and log index order"""
+    query = IndexedEvent.select().where(IndexedEvent.chain == chain)
+    if processed is not None:
+        query = query.where(IndexedEvent.processed == processed)
+    if from_block is not None:
+        query = query.where(IndexedEvent.block_number >= from_block)
+    if to_block is not None:
+        query = query.where(IndexedEvent.block_number <= to_block)
+    if address is not None:
+        query = query.where(IndexedEvent.address == Web3.to_checksum_address(address))
+    if event is not None:
+        query = query.where(IndexedEvent.event == event)
+    if tracked_events is not None:
+        query = query.where(
+            reduce(
+                operator.or_,
+                [
+                    (IndexedEvent.address == Web3.to_checksum_address(address))
+                    & (IndexedEvent.event == event_name)
+                    for address, event_name in tracked_events
+                ],
+                Value(False),
+            )
+        )
+    query = query.order_by(IndexedEvent.block_number, IndexedEvent.log_index)
+    return [
+        EventRecord(
+            address=row.address,
+            event=row.event,
+            block_number=row.block_number,
+            transaction_hash=row.transaction_hash,
+            log_index=row.log_index,
+            args=json.loads(row.data),
+        )
+        for row in query
+    ]
+
+
+def mark_processed(chain: str, keys: List[Any]) -> int:
+    """Mark events as processed so they are not consumed again"""
+    n_processed = 0
+    with db.atomic():
+        for block_number, transaction_hash, log_index in keys:
+            n_processed += (
+                IndexedEvent.update(processed=True)
+                .where(
+                    (IndexedEvent.chain == chain)
+                    & (IndexedEvent.block_number == block_number)
+                    & (IndexedEvent.transaction_hash == transaction_hash)
+                    & (IndexedEvent.log_index == log_index)
+                )
+                .execute()
+            )
+    return n_processed
+
+
+def remove_events(chain: str, keys: List[Any]) -> int:
+    """Remove events from the index, like the ones dropped by a reorg"""
+    n_removed = 0
+    with db.atomic():
+        for block_number, transaction_hash, log_index in keys:
+            n_removed += (
+                IndexedEvent.delete()
+                .where(
+                    (IndexedEvent.chain == chain)
+                    & (IndexedEvent.block_number == block_number)
+                    & (IndexedEvent.transaction_hash == transaction_hash)
+                    & (IndexedEvent.log_index == log_index)
+                )
+                .execute()
+            )
+    return n_removed
+
+
+def set_tracked_events(chain: str, tracked_events: Iterable[Tuple[str, str]]) -> None:
+    """Replace the contract addresses and events tracked on a chain"""
+    with db.atomic():
+        TrackedEvent.delete().where(TrackedEvent.chain == chain).execute()
+        TrackedEvent.insert_many(
+            [
+                {"chain": chain, "address": address, "event": event}
+                for address, event in set(tracked_events)
+            ]
+        ).execute()
+
+
+def get_tracked_events(chain: str) -> Dict[str, List[str]]:
+    """Get the event names tracked on a chain, per contract address"""
+    contracts: Dict[str, List[str]] = {}
+    query = (
+        TrackedEvent.select()
+        .where(TrackedEvent.chain == chain)
+        .order_by(TrackedEvent.address, TrackedEvent.event)
+    )
+    for row in query:
+        contracts.setdefault(row.address, []).append(row.event)
+    return contracts
+
+
+def get_checkpoints(
+    chain: str, tracked_events: Iterable[Tuple[str, str]]
+) -> Dict[Tuple[str, str], int]:
+    """Get the latest scanned block for the tracked contract addresses and events that have one"""
+    tracked_events = set(tracked_events)
+    return {
+        (row.address, row.event): row.block_number
+        for row in Checkpoint.select().where(Checkpoint.chain == chain)
+        if (row.address, row.event) in tracked_events
+    }
+
+
+def commit_window(
+    chain: str,
+    events: List[EventRecord],
+    tracked_events: Iterable[Tuple[str, str]],
+    block_number: int,
+    processed: bool = False,
+) -> None:
+    """Add the events of a scanned window and move the checkpoints forward, atomically"""
+    with db.atomic():
+        _append_events(chain, events, processed)
+        Checkpoint.insert_many(
+            [
+                {
+                    "chain": chain,
+                    "address": address,
+                    "event": event,
+                    "block_number": block_number,
+                }
+                for address, event in tracked_events
+            ]
+        ).on_conflict(
+            conflict_target=[Checkpoint.chain, Checkpoint.address, Checkpoint.event],
+            update={
+                Checkpoint.block_number: fn.MAX(
+                    Checkpoint.block_number, EXCLUDED.block_number
+                )
+            },
+        ).execute()
+
+
+def set_stream_head(chain: str, block_number: int) -> None:
+    """Record the latest block committed by the log subscription of a chain"""
+    StreamHead.insert(
+        chain=chain, block_number=block_number, timestamp=time.time()
+    ).on_conflict_replace().execute()
+
+
+def get_stream_head(chain: str, max_age: float) -> Optional[int]:
+    """Get the latest block committed by the log subscription of a chain, if it is recent enough"""
+    head = StreamHead.get_or_none(StreamHead.chain == chain)
+    if head is None or time.time() - head.timestamp > max_age:
+        return None
+    return head.block_number
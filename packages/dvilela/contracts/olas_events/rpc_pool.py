@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a pool of RPC endpoints per chain, with health tracking, failover and rate limiting."""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from aea_ledger_ethereum import EthereumApi
+from requests.exceptions import HTTPError, RequestException, Timeout
+from web3.exceptions import MismatchedABI
+
+
+_logger = logging.getLogger("aea.packages.dvilela.contracts.olas_events.rpc_pool")
+
+T = TypeVar("T")
+
+MAX_CONCURRENT_REQUESTS_PER_ENDPOINT = 4
+# Assumed latency of endpoints that have not answered yet, once they have a request in flight
+UNKNOWN_LATENCY_SECONDS = 1.0
+LATENCY_SMOOTHING = 0.3
+ERROR_RATE_SMOOTHING = 0.2
+# The circuit opens after several consecutive failures or a high error rate
+MAX_CONSECUTIVE_FAILURES = 3
+MAX_ERROR_RATE = 0.5
+MIN_REQUESTS_FOR_ERROR_RATE = 5
+CIRCUIT_COOLDOWN_SECONDS = 30.0
+MAX_CIRCUIT_COOLDOWN_SECONDS = 300.0
+# Throttled requests halve the request rate, which then recovers a bit with every success
+MIN_REQUESTS_PER_SECOND = 0.5
+# Bursts are limited to a fraction of a second worth of requests
+BURST_SECONDS = 0.25
+RATE_RECOVERY = 0.05
+
+# Errors that come from the request itself (too many blocks or results), not from the endpoint health
+REQUEST_ERRORS = (
+    "more than",
+    "too many",
+    "too large",
+    "limit exceeded",
+    "block range",
+    "response size",
+)
+RATE_LIMIT_ERRORS = ("too many requests", "rate limit", "exceeded the quota")
+ENDPOINT_ERRORS = (ValueError, MismatchedABI, RequestException)
+
+
+class RequestBudgetExhausted(Exception):
+    """The requests allowed for the current period have been spent."""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an error means that the RPC is throttling the requests"""
+    response = getattr(error, "response", None)
+    if isinstance(error, HTTPError) and response is not None:
+        return response.status_code == 429
+    message = str(error).lower()
+    return any(e in message for e in RATE_LIMIT_ERRORS)
+
+
+def is_request_error(error: Exception) -> bool:
+    """Check whether an error is caused by the request rather than by the endpoint"""
+    if isinstance(error, Timeout) or is_rate_limit_error(error):
+        return False
+    message = str(error).lower()
+    return any(e in message for e in REQUEST_ERRORS)
+
+
+class RequestLimiter:  # pylint: disable=too-many-instance-attributes
+    """
+    The request rate and the request budget of a chain, shared by all the contracts.
+
+    A token bucket lets requests through at a steady rate, with short bursts. Every request also spends from the budget of the current
+    period, and no more requests are sent once it is exhausted until the next period.
+    """
+
+    def __init__(
+        self,
+        chain_name: str,
+        now: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Init"""
+        self.chain_name = chain_name
+        self.now = now
+        self.sleep = sleep
+        self.max_rate: Optional[float] = None
+        self.rate: Optional[float] = None
+        self.tokens = 0.0
+        self.updated = now()
+        self.budget: Optional[int] = None
+        self.period: Optional[int] = None
+        self.spent = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        requests_per_second: Optional[float] = None,
+        requests_per_period: Optional[int] = None,
+        period: Optional[int] = None,
+    ) -> None:
+        """Set the limits. The budget is restored when a new period starts."""
+        with self._lock:
+            if requests_per_second != self.max_rate:
+                self.max_rate = self.rate = requests_per_second
+                self.tokens = self.capacity
+            self.budget = requests_per_period
+            if period != self.period:
+                self.period = period
+                self.spent = 0
+
+    @property
+    def capacity(self) -> float:
+        """Get the maximum burst"""
+        return max((self.rate or 0.0) * BURST_SECONDS, 1.0)
+
+    @property
+    def exhausted(self) -> bool:
+        """Check whether the budget of the current period has been spent"""
+        return self.budget is not None and self.spent >= self.budget
+
+    def acquire(self) -> None:
+        """Spend a request from the budget and wait for the token bucket to let it through"""
+        self.spend()
+        self.wait()
+
+    def spend(self) -> None:
+        """Spend a request from the budget of the current period"""
+        with self._lock:
+            if self.exhausted:
+                raise RequestBudgetExhausted(
+                    f"The {self.budget} RPC requests for period {self.period} on {self.chain_name} have been spent"
+                )
+            self.spent += 1
+
+    def wait(self) -> None:
+        """Wait for the token bucket to let a request through"""
+        while True:
+            with self._lock:
+                if self.rate is None:
+                    return
+                now = self.now()
+                self.tokens = min(
+                    self.tokens + (now - self.updated) * self.rate, self.capacity
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def record_success(self) -> None:
+        """Recover the request rate after being throttled"""
+        with self._lock:
+            if self.rate is not None and self.max_rate is not None:
+                self.rate = min(
+                    self.rate + self.max_rate * RATE_RECOVERY, self.max_rate
+                )
+
+    def record_throttled(self) -> None:
+        """Halve the request rate after the RPC throttled a request"""
+        with self._lock:
+            self.throttled += 1
+            if self.rate is not None:
+                self.rate = max(self.rate / 2, MIN_REQUESTS_PER_SECOND)
+                self.tokens = min(self.tokens, 0.0)
+
+    def to_dict(self) -> Dict:
+        """Get the rate and the spent budget"""
+        return dict(
+            requests_per_second=self.rate,
+            budget=self.budget,
+            spent=self.spent,
+            throttled=self.throttled,
+        )
+
+
+class RpcEndpoint:  # pylint: disable=too-many-instance-attributes
+    """
+    An RPC endpoint and its health.
+
+    The latency and the error rate are exponentially weighted moving averages of the
+    latest requests. When the endpoint fails too often its circuit opens and it gets
+    no requests until the cooldown is over. Then a single trial request is let through:
+    if it succeeds the circuit closes, otherwise it opens again for twice as long.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ledger_api: EthereumApi,
+        max_requests: int = MAX_CONCURRENT_REQUESTS_PER_ENDPOINT,
+    ) -> None:
+        """Init"""
+        self.url = url
+        self.ledger_api = ledger_api
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.n_requests = 0
+        self.n_failures = 0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.open_until = 0.0
+        self.cooldown = CIRCUIT_COOLDOWN_SECONDS
+        self.trial_in_flight = False
+        self.semaphore = threading.BoundedSemaphore(max_requests)
+
+    @property
+    def is_open(self) -> bool:
+        """Check whether the circuit is open, so the endpoint should not be used"""
+        return time.monotonic() < self.open_until or self.trial_in_flight
+
+    @property
+    def is_half_open(self) -> bool:
+        """Check whether the cooldown is over and the next request is a trial"""
+        return self.open_until > 0 and not self.is_open
+
+    def score(self) -> float:
+        """Get the expected wait for a new request. Idle endpoints without requests yet go first."""
+        if self.latency is None:
+            return UNKNOWN_LATENCY_SECONDS * self.in_flight
+        return self.latency * (self.in_flight + 1)
+
+    def record_success(self, elapsed: float) -> None:
+        """Update the latency and close the circuit"""
+        self.n_requests += 1
+        self.latency = (
+            elapsed
+            if self.latency is None
+            else LATENCY_SMOOTHING * elapsed + (1 - LATENCY_SMOOTHING) * self.latency
+        )
+        self.error_rate *= 1 - ERROR_RATE_SMOOTHING
+        self.consecutive_failures = 0
+        if self.open_until:
+            _logger.info(f"RPC endpoint {self.url} has recovered")
+        self.open_until = 0.0
+        self.cooldown = CIRCUIT_COOLDOWN_SECONDS
+
+    def record_failure(self, error: Exception) -> None:
+        """Update the error rate and open the circuit if the endpoint is failing"""
+        self.n_requests += 1
+        self.n_failures += 1
+        self.error_rate = ERROR_RATE_SMOOTHING + (1 - ERROR_RATE_SMOOTHING) * (
+            self.error_rate
+        )
+        self.consecutive_failures += 1
+
+        # Requests sent before the circuit opened. A failed trial reopens it for longer.
+        if time.monotonic() < self.open_until:
+            return
+        if self.open_until:
+            self.cooldown = min(self.cooldown * 2, MAX_CIRCUIT_COOLDOWN_SECONDS)
+        elif not (
+            self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES
+            or (
+                self.n_requests >= MIN_REQUESTS_FOR_ERROR_RATE
+                and self.error_rate > MAX_ERROR_RATE
+            )
+        ):
+            return
+
+        self.open_until = time.monotonic() + self.cooldown
+        _logger.warning(
+            f"RPC endpoint {self.url} is failing ({error}). Skipping it for {self.cooldown:.0f}s"
+        )
+
+    def to_dict(self) -> Dict:
+        """Get the health of the endpoint"""
+        return dict(
+            url=self.url,
+            latency=self.latency,
+            error_rate=round(self.error_rate, 3),
+            requests=self.n_requests,
+            failures=self.n_failures,
+            open=self.is_open,
+        )
+
+
+class RpcPool:
+    """
+    The RPC endpoints of a chain.
+
+    Every request goes to the healthy endpoint with the lowest expected wait, given its
+    latency and the requests it already has in flight, so concurrent requests spread
+    across endpoints. A failed request is retried right away on the next best endpoint.
+    """
+
+    def __init__(
+        self,
+        chain_name: str,
+        endpoints: List[RpcEndpoint],
+        limiter: Optional[RequestLimiter] = None,
+    ) -> None:
+        """Init"""
+        self.chain_name = chain_name
+        self.endpoints = endpoints
+        self.limiter = limiter or RequestLimiter(chain_name)
+        self._lock = threading.Lock()
+
+    @property
+    def n_healthy(self) -> int:
+        """Get the number of endpoints that take requests"""
+        return sum(not endpoint.is_open for endpoint in self.endpoints)
+
+    def acquire(self, exclude: List[RpcEndpoint]) -> Optional[RpcEndpoint]:
+        """Pick the best endpoint and count the request as in flight"""
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if not e.is_open]
+
+            # If every circuit is open, try the one that reopens first rather than stalling
+            endpoint = (
+                min(healthy, key=RpcEndpoint.score)
+                if healthy
+                else min(candidates, key=lambda e: e.open_until)
+            )
+            if endpoint.is_half_open:
+                endpoint.trial_in_flight = True
+            endpoint.in_flight += 1
+            return endpoint
+
+    def release(
+        self,
+        endpoint: RpcEndpoint,
+        elapsed: float,
+        error: Optional[Exception] = None,
+    ) -> None:
+        """Record the outcome of a request"""
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.trial_in_flight = False
+            if error is None:
+                endpoint.record_success(elapsed)
+            elif not is_request_error(error):
+                endpoint.record_failure(error)
+
+    def call(self, method: Callable[[EthereumApi], T]) -> T:
+        """
+        Run a request on the best endpoint, failing over to the others.
+
+        The call spends one request from the budget, and every attempt goes through the rate limiter.
+
+        :param method: a function that sends the request through a ledger api.
+        :return: the method result.
+        :raises RequestBudgetExhausted: if the budget of the current period has been spent.
+        """
+        tried: List[RpcEndpoint] = []
+        error: Exception = RuntimeError(
+            f"No RPC endpoint available on {self.chain_name}"
+        )
+        self.limiter.spend()
+        while True:
+            self.limiter.wait()
+            endpoint = self.acquire(tried)
+            if endpoint is None:
+                raise error
+            tried.append(endpoint)
+
+            start_time = time.monotonic()
+            try:
+                with endpoint.semaphore:
+                    start_time = time.monotonic()
+                    result = method(endpoint.ledger_api)
+            except ENDPOINT_ERRORS as e:
+                self.release(endpoint, time.monotonic() - start_time, e)
+                if is_rate_limit_error(e):
+                    self.limiter.record_throttled()
+                # Requests that are too large fail the same way everywhere
+                if is_request_error(e):
+                    raise
+                _logger.error(
+                    f"Error from RPC endpoint {endpoint.url} on {self.chain_name}: {e}"
+                )
+                error = e
+                continue
+
+            self.release(endpoint, time.monotonic() - start_time)
+            self.limiter.record_success()
+            return result
+
+    def to_dict(self) -> Dict:
+        """Get the health of every endpoint and the limiter state"""
+        return dict(
+            chain_name=self.chain_name,
+            endpoints=[endpoint.to_dict() for endpoint in self.endpoints],
+            limiter=self.limiter.to_dict(),
+        )
+
+
+_pools: Dict[Tuple[str, Tuple[str, ...]], RpcPool] = {}
+_limiters: Dict[str, RequestLimiter] = {}
+_pools_lock = threading.Lock()
+
+
+def get_rpc_pool(
+    ledger_api: EthereumApi,
+    chain_name: str,
+    rpc_urls: Optional[List[str]] = None,
+    rpc_limits: Optional[Dict[str, Any]] = None,
+) -> RpcPool:
+    """
+    Get the RPC pool of a chain: the ledger api endpoint followed by the extra urls.
+
+    Pools are kept between calls, so the endpoint health is remembered across periods.
+    All the pools of a chain share its request limiter.
+
+    :param ledger_api: the ledger api.
+    :param chain_name: the chain name.
+    :param rpc_urls: extra RPC endpoints for the chain, if any.
+    :param rpc_limits: the requests_per_second, requests_per_period and current period, if any.
+    :return: the RPC pool.
+    """
+    primary_url = getattr(ledger_api.api.provider, "endpoint_uri", None) or ""
+    urls = tuple(dict.fromkeys([primary_url, *(rpc_urls or [])]))
+    with _pools_lock:
+        limiter = _limiters.setdefault(chain_name, RequestLimiter(chain_name))
+        if (chain_name, urls) not in _pools:
+            _pools[(chain_name, urls)] = RpcPool(
+                chain_name,
+                [RpcEndpoint(primary_url, ledger_api)]
+                + [
+                    RpcEndpoint(url, EthereumApi(address=url))
+                    for url in urls
+                    if url != primary_url
+                ],
+                limiter,
+            )
+    if rpc_limits is not None:
+        limiter.configure(**rpc_limits)
+    return _pools[(chain_name, urls)]
+
+
+def reset_rpc_pools(limiters: Optional[Dict[str, RequestLimiter]] = None) -> None:
+    """Forget the RPC pools and the request limiters of every chain, optionally replacing the limiters"""
+    with _pools_lock:
+        _pools.clear()
+        _limiters.clear()
+        _limiters.update(limiters or {})
@@ -0,0 +1,652 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the event scanning engine shared by the Olas contracts."""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+from aea.common import JSONLike
+from aea_ledger_ethereum import EthereumApi
+from eth_abi.codec import ABICodec
+from eth_abi.exceptions import DecodingError
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from requests.exceptions import RequestException
+from web3 import Web3
+from web3.exceptions import MismatchedABI
+from web3.types import LogReceipt
+
+from packages.dvilela.contracts.olas_events.rpc_pool import (
+    RequestBudgetExhausted,
+    RpcPool,
+    is_request_error,
+)
+
+
+_logger = logging.getLogger("aea.packages.dvilela.contracts.olas_events.scanner")
+
+
+INITIAL_WINDOW_BLOCKS = 5000
+MIN_WINDOW_BLOCKS = 100
+MAX_WINDOW_BLOCKS = 500000
+FAST_RESPONSE_SECONDS = 2.0
+SMALL_RESPONSE_LOGS = 1000
+MAX_RETRIES = 5
+# Retries for a window, including the ones of the halves it is split into
+MAX_WINDOW_RETRIES = 10
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+MAX_SCAN_WORKERS = 4
+MAX_CONCURRENT_REQUESTS_PER_RPC = 4
+# Keep the scan well inside the round timeout (30 seconds)
+SCAN_TIME_BUDGET_SECONDS = 20.0
+
+
+class AdaptiveBlockWindow:
+    """A block window that adapts its size to the RPC responses."""
+
+    def __init__(
+        self,
+        size: int = INITIAL_WINDOW_BLOCKS,
+        min_size: int = MIN_WINDOW_BLOCKS,
+        max_size: int = MAX_WINDOW_BLOCKS,
+    ) -> None:
+        """Init"""
+        self.min_size = min_size
+        self.max_size = max_size
+        self._size = size
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Get the current window size"""
+        return self._size
+
+    def record_success(self, elapsed: float, n_results: int) -> None:
+        """Grow the window after a fast response with few results"""
+        if elapsed >= FAST_RESPONSE_SECONDS or n_results >= SMALL_RESPONSE_LOGS:
+            return
+        with self._lock:
+            self._size = min(self._size * 2, self.max_size)
+
+    def record_failure(self, error: Exception, n_blocks: int) -> None:
+        """Halve the window after a too-many-results error. Block range limits also cap its growth."""
+        if not is_window_error(error):
+            return
+        with self._lock:
+            self._size = max(self._size // 2, self.min_size)
+            if "range" in str(error).lower():
+                self.max_size = max(min(self.max_size, n_blocks // 2), self.min_size)
+
+
+_windows: Dict[Tuple[str, Optional[str]], AdaptiveBlockWindow] = {}
+_rpc_semaphores: Dict[Optional[str], threading.BoundedSemaphore] = {}
+_windows_lock = threading.Lock()
+
+
+def is_window_error(error: Exception) -> bool:
+    """Check whether an error means that the block window was too large"""
+    # The request errors of a log query are about its block range or its number of results.
+    # Timeouts are transport errors: they are retried without splitting the window.
+    return is_request_error(error)
+
+
+def get_block_window(ledger_api: EthereumApi, chain_name: str) -> AdaptiveBlockWindow:
+    """Get the window learned for a chain and RPC. It is kept between periods."""
+    rpc = getattr(ledger_api.api.provider, "endpoint_uri", None)
+    with _windows_lock:
+        return _windows.setdefault((chain_name, rpc), AdaptiveBlockWindow())
+
+
+def get_rpc_semaphore(
+    ledger_api: EthereumApi, max_requests: int = MAX_CONCURRENT_REQUESTS_PER_RPC
+) -> threading.BoundedSemaphore:
+    """Get the semaphore that limits the concurrent requests to an RPC, shared by all the scans. The first scan sets its size."""
+    rpc = getattr(ledger_api.api.provider, "endpoint_uri", None)
+    with _windows_lock:
+        return _rpc_semaphores.setdefault(rpc, threading.BoundedSemaphore(max_requests))
+
+
+class RetryBudget:
+    """The retries and the time left to fetch a window, shared by all its halves."""
+
+    def __init__(
+        self, retries: int = MAX_WINDOW_RETRIES, deadline: Optional[float] = None
+    ) -> None:
+        """Init"""
+        self.retries = retries
+        self.deadline = deadline
+
+    @property
+    def expired(self) -> bool:
+        """Check whether the deadline has passed"""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def spend(self) -> bool:
+        """Take a retry, if there are any left"""
+        if self.retries <= 0:
+            return False
+        self.retries -= 1
+        return True
+
+    def sleep(self, delay: float) -> None:
+        """Sleep before the next attempt, without going past the deadline"""
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Get an exponential backoff delay with full jitter"""
+    return random.uniform(  # nosec
+        0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+    )
+
+
+def fetch_window(  # pylint: disable=too-many-arguments
+    fetch: Callable[[int, int], List],
+    window: AdaptiveBlockWindow,
+    semaphore: ContextManager,
+    window_start: int,
+    window_end: int,
+    deadline: Optional[float] = None,
+    retries: Optional[RetryBudget] = None,
+) -> Tuple[List, int]:
+    """
+    Fetch the logs for a block window using stateless log queries.
+
+    Failed attempts are retried with exponential backoff. If the RPC complains that
+    the window is too large, it is split in two halves that are fetched one after
+    the other. The window and its halves share a bounded number of retries, and no
+    attempt starts after the deadline. Once the request budget is spent, the window
+    fails right away.
+
+    :param fetch: a function that gets the logs between two blocks (both inclusive).
+    :param window: the adaptive block window.
+    :param semaphore: the semaphore that limits the concurrent requests to the RPC.
+    :param window_start: the first block of the window.
+    :param window_end: the last block of the window.
+    :param deadline: the monotonic time after which no new attempts are started.
+    :param retries: the retry budget shared with the window that was split, if any.
+    :return: the logs and the latest fetched block. It is before window_end if the retries or the time ran out.
+    """
+    retries = retries or RetryBudget(deadline=deadline)
+    for attempt in range(MAX_RETRIES):
+        # Splitting a window is not a retry, the halves are new requests
+        if retries.expired or (attempt > 0 and not retries.spend()):
+            break
+        start_time = time.monotonic()
+        try:
+            with semaphore:
+                logs = fetch(window_start, window_end)
+        except RequestBudgetExhausted as e:
+            _logger.warning(
+                f"Not getting logs for blocks {window_start}-{window_end}: {e}"
+            )
+            break
+        # Gnosis RPCs sometimes return MismatchedABI: The event signature did not
+        # match the provided ABI. Retrying several times makes it work.
+        except (ValueError, MismatchedABI, RequestException) as e:
+            _logger.error(
+                f"Error getting logs for blocks {window_start}-{window_end} [attempt {attempt + 1}/{MAX_RETRIES}]: {e}"
+            )
+            window.record_failure(e, window_end - window_start + 1)
+            if is_window_error(e) and window_end > window_start:
+                middle = (window_start + window_end) // 2
+                first_half, latest_block = fetch_window(
+                    fetch, window, semaphore, window_start, middle, retries=retries
+                )
+                if latest_block < middle:
+                    return first_half, latest_block
+                second_half, latest_block = fetch_window(
+                    fetch, window, semaphore, middle + 1, window_end, retries=retries
+                )
+                return first_half + second_half, latest_block
+            if attempt < MAX_RETRIES - 1:
+                retries.sleep(backoff_delay(attempt))
+            continue
+        window.record_success(time.monotonic() - start_time, len(logs))
+        return logs, window_end
+    return [], window_start - 1
+
+
+def scan_blocks(  # pylint: disable=too-many-arguments,too-many-locals
+    fetch: Callable[[int, int], List],
+    ledger_api: EthereumApi,
+    chain_name: str,
+    from_block: int,
+    to_block: int,
+    time_budget: float = SCAN_TIME_BUDGET_SECONDS,
+    on_window: Optional[Callable[[int, int, List], None]] = None,
+    max_workers: int = MAX_SCAN_WORKERS,
+    rpc_pool: Optional[RpcPool] = None,
+) -> Tuple[List, int, Optional[str]]:
+    """
+    Fetch the logs for a block range, several windows at a time.
+
+    Windows are sized by the adaptive block window and fetched by a bounded worker
+    pool, while a per-RPC semaphore caps the requests in flight. With an RPC pool,
+    every endpoint caps its own requests instead. The results are
+    reassembled in block order and only the contiguous prefix of fetched windows
+    is returned, so the caller can always resume from the latest block. No new
+    windows are started once the time budget or the RPC pool request budget is spent.
+
+    :param fetch: a function that gets the logs between two blocks (both inclusive).
+    :param ledger_api: the ledger api.
+    :param chain_name: the chain name.
+    :param from_block: the first block to scan (inclusive).
+    :param to_block: the last block to scan (inclusive).
+    :param time_budget: the seconds after which no new windows or attempts are started.
+    :param on_window: called in block order with the start, end and logs of every fetched window.
+    :param max_workers: the maximum number of windows fetched at the same time.
+    :param rpc_pool: the RPC pool the fetch function sends its requests through, if any.
+    :return: the logs in block order, the latest scanned block and an error, if any.
+    """
+    window = get_block_window(ledger_api, chain_name)
+    semaphore: ContextManager = (
+        nullcontext()
+        if rpc_pool is not None
+        else get_rpc_semaphore(
+            ledger_api, max(max_workers, MAX_CONCURRENT_REQUESTS_PER_RPC)
+        )
+    )
+    deadline = time.monotonic() + time_budget
+
+    results: Dict[int, Tuple[int, List]] = {}
+    all_logs: List = []
+    latest_block = from_block - 1
+    error = None
+    next_start = from_block
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: Dict[Future, Tuple[int, int]] = {}
+        while True:
+            # Keep the pool busy while there are blocks left, no failures and time to spare
+            while (
+                len(pending) < max_workers
+                and next_start <= to_block
+                and error is None
+                and time.monotonic() < deadline
+                and not (rpc_pool is not None and rpc_pool.limiter.exhausted)
+            ):
+                window_end = min(next_start + window.size - 1, to_block)
+                future = executor.submit(
+                    fetch_window,
+                    fetch,
+                    window,
+                    semaphore,
+                    next_start,
+                    window_end,
+                    deadline,
+                )
+                pending[future] = (next_start, window_end)
+                next_start = window_end + 1
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window_start, window_end = pending.pop(future)
+                logs, window_latest_block = future.result()
+
+                # Windows that ran out of retries or time keep the blocks they got
+                if window_latest_block >= window_start:
+                    results[window_start] = (window_latest_block, logs)
+                if window_latest_block < window_end and error is None:
+                    error = f"Could not get the logs for blocks {window_latest_block + 1}-{window_end}"
+
+            # Reassemble the windows in block order, up to the first failed one
+            while latest_block + 1 in results:
+                window_end, logs = results.pop(latest_block + 1)
+                if on_window:
+                    on_window(latest_block + 1, window_end, logs)
+                all_logs += logs
+                latest_block = window_end
+
+    # The next scan resumes right after the contiguous prefix
+    if rpc_pool is not None and rpc_pool.limiter.exhausted and latest_block < to_block:
+        error = f"Request budget exhausted before block {latest_block + 1}"
+    elif latest_block < to_block and (error is None or time.monotonic() >= deadline):
+        error = f"Time budget exhausted before block {latest_block + 1}"
+
+    return all_logs, latest_block, error
+
+
+class EventRecord(NamedTuple):
+    """A decoded event, holding only what the skill uses."""
+
+    address: str
+    event: str
+    block_number: int
+    transaction_hash: str
+    log_index: int
+    args: Dict[str, Any]
+
+
+def pack_events(
+    events: List[EventRecord], fields: Optional[Dict[str, List[str]]] = None
+) -> JSONLike:
+    """
+    Pack events into a compact payload to send them to the skill.
+
+    Every event is a row [address index, event, block number, transaction hash, log index, values],
+    where the values follow the argument names listed once per event in "fields".
+
+    :param events: the events.
+    :param fields: the arguments to keep per event name. Events not listed keep all of them.
+    :return: the packed events.
+    """
+    fields = dict(fields or {})
+    addresses: List[str] = []
+    address_to_index: Dict[str, int] = {}
+    rows = []
+    for event in events:
+        if event.address not in address_to_index:
+            address_to_index[event.address] = len(addresses)
+            addresses.append(event.address)
+        names = fields.setdefault(event.event, list(event.args.keys()))
+        rows.append(
+            [
+                address_to_index[event.address],
+                event.event,
+                event.block_number,
+                event.transaction_hash,
+                event.log_index,
+                [event.args[name] for name in names],
+            ]
+        )
+    return dict(addresses=addresses, fields=fields, rows=rows)
+
+
+def unpack_events(payload: JSONLike) -> List[EventRecord]:
+    """Unpack the events packed by pack_events"""
+    addresses = cast(List[str], payload["addresses"])
+    fields = cast(Dict[str, List[str]], payload["fields"])
+    return [
+        EventRecord(
+            address=addresses[address_index],
+            event=event,
+            block_number=block_number,
+            transaction_hash=transaction_hash,
+            log_index=log_index,
+            args=dict(zip(fields[event], values)),
+        )
+        for address_index, event, block_number, transaction_hash, log_index, values in cast(
+            List, payload["rows"]
+        )
+    ]
+
+
+def normalize_value(abi_type: str, value: Any) -> Any:
+    """Turn decoded values into plain JSON friendly types: checksummed addresses and hex bytes"""
+    if abi_type.endswith("]"):
+        item_type = abi_type[: abi_type.rindex("[")]
+        return [normalize_value(item_type, item) for item in value]
+    if abi_type == "address":
+        return Web3.to_checksum_address(value)
+    if isinstance(value, bytes):
+        return Web3.to_hex(value)
+    return value
+
+
+class EventDecoder:  # pylint: disable=too-few-public-methods
+    """Decodes the logs of an event straight from their topics and data."""
+
+    __slots__ = ("name", "topic", "indexed", "data_names", "data_types")
+
+    def __init__(self, event_abi: Dict) -> None:
+        """Init"""
+        self.name = event_abi["name"]
+        self.topic = Web3.to_hex(event_abi_to_log_topic(event_abi))
+        self.indexed = [
+            (i["name"], i["type"]) for i in event_abi["inputs"] if i["indexed"]
+        ]
+        self.data_names = [i["name"] for i in event_abi["inputs"] if not i["indexed"]]
+        self.data_types = [i["type"] for i in event_abi["inputs"] if not i["indexed"]]
+
+    def decode(self, codec: ABICodec, log: LogReceipt) -> EventRecord:
+        """Decode a log"""
+        topics = log["topics"][1:]
+        if len(topics) != len(self.indexed):
+            raise ValueError(
+                f"Expected {len(self.indexed)} indexed arguments for {self.name}, got {len(topics)}"
+            )
+
+        args = {}
+        for (name, abi_type), topic in zip(self.indexed, topics):
+            # Dynamic indexed arguments are only available as their hash
+            if abi_type in ("string", "bytes") or abi_type.endswith("]"):
+                args[name] = Web3.to_hex(topic)
+            else:
+                args[name] = normalize_value(
+                    abi_type, codec.decode([abi_type], HexBytes(topic))[0]
+                )
+
+        values = codec.decode(self.data_types, HexBytes(log["data"]))
+        for name, abi_type, value in zip(self.data_names, self.data_types, values):
+            args[name] = normalize_value(abi_type, value)
+
+        return EventRecord(
+            address=log["address"],
+            event=self.name,
+            block_number=int(log["blockNumber"]),
+            transaction_hash=Web3.to_hex(log["transactionHash"]),
+            log_index=int(log["logIndex"]),
+            args=args,
+        )
+
+
+_decoders: Dict[str, Dict[str, EventDecoder]] = {}
+_decoders_lock = threading.Lock()
+
+
+def get_decoders(key: str, abi: List[Dict]) -> Dict[str, EventDecoder]:
+    """Get the topic0 to decoder mapping for an abi. It is computed once per key."""
+    with _decoders_lock:
+        if key not in _decoders:
+            decoders = [
+                EventDecoder(entry) for entry in abi if entry.get("type") == "event"
+            ]
+            _decoders[key] = {decoder.topic: decoder for decoder in decoders}
+        return _decoders[key]
+
+
+class EventScanner:  # pylint: disable=too-few-public-methods
+    """The events of a contract, with their decoders precomputed."""
+
+    def __init__(self, address: str, decoders: Dict[str, EventDecoder]) -> None:
+        """Init"""
+        self.address = Web3.to_checksum_address(address)
+        self.topic_to_decoder = decoders
+        self.event_to_topic = {
+            decoder.name: topic for topic, decoder in decoders.items()
+        }
+
+    def decode(self, codec: ABICodec, log: LogReceipt) -> Optional[EventRecord]:
+        """Decode a log, if it belongs to a known event"""
+        decoder = self.topic_to_decoder.get(Web3.to_hex(log["topics"][0]))
+        if decoder is None:
+            return None
+        try:
+            return decoder.decode(codec, log)
+        # Gnosis RPCs sometimes return logs that do not match the event abi
+        except (DecodingError, ValueError) as e:
+            _logger.error(f"Error decoding {decoder.name} log: {e}")
+            return None
+
+
+_scanners: Dict[Tuple[str, str, str], EventScanner] = {}
+_scanners_lock = threading.Lock()
+
+
+def get_event_scanner(
+    contract_id: str,
+    chain_name: str,
+    address: str,
+    abi: List[Dict],
+) -> EventScanner:
+    """Get the event scanner for a contract. It is cached per chain and address."""
+    key = (contract_id, chain_name, Web3.to_checksum_address(address))
+    with _scanners_lock:
+        if key not in _scanners:
+            _scanners[key] = EventScanner(
+                address, get_decoders(f"{contract_id}:{chain_name}", abi)
+            )
+        return _scanners[key]
+
+
+def build_log_filter(
+    tracked_events: Iterable[Tuple[EventScanner, Iterable[str]]]
+) -> Tuple[Dict[str, Tuple[EventScanner, Set[str]]], List[str]]:
+    """Map every tracked address to its scanner and event names, and get the topics to query"""
+    address_to_events = {
+        scanner.address: (scanner, set(event_names))
+        for scanner, event_names in tracked_events
+    }
+    topics = sorted(
+        {
+            scanner.event_to_topic[event_name]
+            for scanner, event_names in address_to_events.values()
+            for event_name in event_names
+        }
+    )
+    return address_to_events, topics
+
+
+def decode_logs(
+    codec: ABICodec,
+    address_to_events: Dict[str, Tuple[EventScanner, Set[str]]],
+    logs: Iterable[LogReceipt],
+) -> List[EventRecord]:
+    """Route logs back to their contract and decode the tracked ones, in block and log index order"""
+    events = []
+    for log in logs:
+        scanner, event_names = address_to_events.get(log["address"], (None, set()))
+        event = scanner.decode(codec, log) if scanner else None
+        if event is not None and event.event in event_names:
+            events.append(event)
+    events.sort(key=lambda e: (e.block_number, e.log_index))
+    return events
+
+
+def scan_events(  # pylint: disable=too-many-arguments,too-many-locals
+    ledger_api: EthereumApi,
+    chain_name: str,
+    tracked_events: List[Tuple[EventScanner, Iterable[str]]],
+    from_block: int,
+    to_block: Union[int, str] = "latest",
+    time_budget: float = SCAN_TIME_BUDGET_SECONDS,
+    on_events: Optional[Callable[[int, int, List], None]] = None,
+    max_workers: int = MAX_SCAN_WORKERS,
+    rpc_pool: Optional[RpcPool] = None,
+) -> JSONLike:
+    """
+    Get the events of one or several contracts.
+
+    A single log query per block window covers every tracked address and event topic.
+    The logs are then routed back to their contract and decoded.
+
+    With an RPC pool, the windows are spread across its healthy endpoints, with
+    max_workers windows in flight per endpoint, and failed requests fail over.
+
+    :param ledger_api: the ledger api.
+    :param chain_name: the chain name.
+    :param tracked_events: the event scanners and the event names to track for each of them.
+    :param from_block: the first block to scan (inclusive).
+    :param to_block: the last block to scan (inclusive).
+    :param time_budget: the seconds after which no new windows or attempts are started.
+    :param on_events: called in block order with the start, end and decoded events of every fetched window.
+    :param max_workers: the maximum number of windows fetched at the same time.
+    :param rpc_pool: the RPC pool of the chain, if any. Otherwise, the ledger api is used.
+    :return: the events sorted by block and log index, the latest scanned block and an error, if any.
+    """
+    address_to_events, topics = build_log_filter(tracked_events)
+
+    call: Callable[[Callable[[EthereumApi], Any]], Any] = (
+        rpc_pool.call if rpc_pool is not None else lambda method: method(ledger_api)
+    )
+    if rpc_pool is not None:
+        max_workers *= max(rpc_pool.n_healthy, 1)
+
+    try:
+        to_block = (
+            call(lambda api: api.api.eth.get_block_number()) - 1
+            if to_block == "latest"
+            else to_block
+        )
+    except RequestBudgetExhausted as e:
+        return dict(events=[], latest_block=from_block - 1, error=str(e))
+
+    events: List = []
+
+    def decode_window(start: int, end: int, logs: List) -> None:
+        """Decode the logs of a window"""
+        window_events = decode_logs(ledger_api.api.codec, address_to_events, logs)
+        events.extend(window_events)
+        if on_events:
+            on_events(start, end, window_events)
+
+    _, latest_block, error = scan_blocks(
+        lambda start, end: call(
+            lambda api: api.api.eth.get_logs(
+                {
+                    "address": list(address_to_events.keys()),
+                    "topics": [topics],
+                    "fromBlock": start,
+                    "toBlock": end,
+                }
+            )
+        ),
+        ledger_api,
+        chain_name,
+        from_block,
+        cast(int, to_block),
+        time_budget,
+        decode_window,
+        max_workers,
+        rpc_pool,
+    )
+
+    result = dict(
+        events=events,
+        latest_block=latest_block,
+    )
+    if error:
+        result["error"] = error
+    return result
@@ -19,14 +19,24 @@
 
 """This module contains the class to connect to the wveolas contract."""
 import logging
-from typing import List, Optional, Union, cast
+from typing import Any, Dict, List, Optional, Union
 
 from aea.common import JSONLike
 from aea.configurations.base import PublicId
 from aea.contracts.base import Contract
 from aea_ledger_ethereum import EthereumApi
 from web3 import Web3
-from web3.exceptions import MismatchedABI
+
+from packages.dvilela.contracts.olas_events.rpc_pool import (
+    RequestBudgetExhausted,
+    RpcPool,
+    get_rpc_pool,
+)
+from packages.dvilela.contracts.olas_events.scanner import (
+    get_event_scanner,
+    pack_events,
+    scan_events,
+)
 
 
 PUBLIC_ID = PublicId.from_str("dvilela/olas_registries:0.1.0")
@@ -35,6 +45,40 @@ _logger = logging.getLogger(
     f"aea.packages.{PUBLIC_ID.author}.contracts.{PUBLIC_ID.name}.contract"
 )
 
+# Multicall3 is deployed at the same address on Ethereum and Gnosis
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    }
+]
+MULTICALL_BATCH_SIZE = 100
+
 EVENT_ABIS = {
     "ethereum": [
         {
@@ -115,67 +159,127 @@ class OlasRegistriesContract(Contract):
         from_block: int,
         to_block: Union[int, str] = "latest",
         chain_name: str = "ethereum",
+        fields: Optional[List[str]] = None,
+        rpc_urls: Optional[List[str]] = None,
+        rpc_limits: Optional[Dict[str, Any]] = None,
     ) -> Optional[JSONLike]:
-        """Get events."""
-        contract_instance = ledger_api.api.eth.contract(
-            Web3.to_checksum_address(contract_address), abi=EVENT_ABIS[chain_name]
+        """Get events, packed with only the given arguments, or all of them."""
+        scanner = get_event_scanner(
+            str(cls.contract_id),
+            chain_name,
+            contract_address,
+            EVENT_ABIS[chain_name],
+        )
+        result = scan_events(
+            ledger_api,
+            chain_name,
+            [(scanner, [event_name])],
+            from_block,
+            to_block,
+            rpc_pool=get_rpc_pool(ledger_api, chain_name, rpc_urls, rpc_limits),
         )
 
-        # Avoid parsing too many blocks at a time. This might take too long and
-        # the connection could time out.
-        MAX_BLOCKS = 5000
+        # Report the failure and the last fully scanned block so the caller can resume
+        if "error" in result:
+            result["error"] = f"Error getting {event_name} events: {result['error']}"
 
-        to_block = (
-            ledger_api.api.eth.get_block_number() - 1
-            if to_block == "latest"
-            else to_block
+        result["events"] = pack_events(
+            result["events"], {event_name: fields} if fields else None
         )
 
-        ranges: List[int] = list(range(from_block, cast(int, to_block), MAX_BLOCKS)) + [
-            cast(int, to_block)
-        ]
-
-        event = getattr(contract_instance.events, event_name)
-        events = []
-        for i in range(len(ranges) - 1):
-            from_block = ranges[i]
-            to_block = ranges[i + 1]
-            new_events = []
-
-            while True:
-                try:
-                    new_events = event.create_filter(
-                        fromBlock=from_block,  # exclusive
-                        toBlock=to_block,  # inclusive
-                    ).get_all_entries()  # limited to 10k entries for now
-                    break
-                # Gnosis RPCs sometimes returns:
-                # ValueError: Filter with id: x does not exist
-                # MismatchedABI: The event signature did not match the provided ABI
-                # Retrying several times makes it work
-                except ValueError as e:
-                    _logger.error(e)
-                except MismatchedABI as e:
-                    _logger.error(e)
-
-            events += new_events
-
-        return dict(
-            events=events,
-            latest_block=int(to_block),
-        )
+        return result
 
     @classmethod
     def get_token_uri(
-        cls, ledger_api: EthereumApi, contract_address: str, unit_id: int
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        unit_id: int,
+        chain_name: str = "ethereum",
+        rpc_urls: Optional[List[str]] = None,
+        rpc_limits: Optional[Dict[str, Any]] = None,
     ) -> Optional[JSONLike]:
-        """Get events."""
-        contract_instance = cls.get_instance(ledger_api, contract_address)
-
-        result = ledger_api.contract_method_call(
-            contract_instance=contract_instance,
-            method_name="tokenURI",
-            unitId=unit_id,
+        """Get the token uri of a unit."""
+        result = get_rpc_pool(ledger_api, chain_name, rpc_urls, rpc_limits).call(
+            lambda api: api.contract_method_call(
+                contract_instance=cls.get_instance(api, contract_address),
+                method_name="tokenURI",
+                unitId=unit_id,
+            )
         )
 
         return {"result": result}
+
+    @classmethod
+    def get_token_uris(
+        cls,
+        ledger_api: EthereumApi,
+        contract_address: str,
+        unit_ids: List[int],
+        chain_name: str = "ethereum",
+        rpc_urls: Optional[List[str]] = None,
+        rpc_limits: Optional[Dict[str, Any]] = None,
+    ) -> Optional[JSONLike]:
+        """Get the token uris of several units, aggregated through multicall."""
+        rpc_pool = get_rpc_pool(ledger_api, chain_name, rpc_urls, rpc_limits)
+        contract_instance = cls.get_instance(ledger_api, contract_address)
+
+        uris: List[Optional[str]] = []
+        for i in range(0, len(unit_ids), MULTICALL_BATCH_SIZE):
+            batch = unit_ids[i : i + MULTICALL_BATCH_SIZE]
+            calls = [
+                (
+                    contract_instance.address,
+                    True,
+                    contract_instance.encodeABI(fn_name="tokenURI", args=[unit_id]),
+                )
+                for unit_id in batch
+            ]
+            try:
+                results = rpc_pool.call(
+                    lambda api, calls=calls: api.api.eth.contract(
+                        Web3.to_checksum_address(MULTICALL3_ADDRESS),
+                        abi=MULTICALL3_ABI,
+                    )
+                    .functions.aggregate3(calls)
+                    .call()
+                )
+                uris += [
+                    (
+                        ledger_api.api.codec.decode(["string"], return_data)[0]
+                        if success
+                        else None
+                    )
+                    for success, return_data in results
+                ]
+
+            # No request can be sent until the next period, so there is nothing to fall back to
+            except RequestBudgetExhausted:
+                raise
+
+            # Chains or nodes without multicall: fall back to one call per unit
+            except Exception as e:  # pylint: disable=broad-except
+                _logger.error(f"Multicall failed, calling tokenURI per unit: {e}")
+                uris += [
+                    cls._get_unit_token_uri(rpc_pool, contract_address, unit_id)
+                    for unit_id in batch
+                ]
+
+        return {"result": uris}
+
+    @classmethod
+    def _get_unit_token_uri(
+        cls, rpc_pool: RpcPool, contract_address: str, unit_id: int
+    ) -> Optional[str]:
+        """Get the token uri of a single unit, or None if the call fails."""
+        try:
+            return rpc_pool.call(
+                lambda api: cls.get_instance(api, contract_address)
+                .functions.tokenURI(unit_id)
+                .call()
+            )
+        except RequestBudgetExhausted:
+            raise
+        except Exception as unit_error:  # pylint: disable=broad-except
+            _logger.error(f"Error getting the uri of unit {unit_id}: {unit_error}")
+            return None
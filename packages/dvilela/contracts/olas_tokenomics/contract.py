@@ -19,13 +19,19 @@
 
 """This module contains the class to connect to the tokenomics contract."""
 import logging
-from typing import List, Optional, Union, cast
+from typing import Any, Dict, List, Optional, Union
 
 from aea.common import JSONLike
 from aea.configurations.base import PublicId
 from aea.contracts.base import Contract
 from aea_ledger_ethereum import EthereumApi
-from web3.exceptions import MismatchedABI
+
+from packages.dvilela.contracts.olas_events.rpc_pool import get_rpc_pool
+from packages.dvilela.contracts.olas_events.scanner import (
+    get_event_scanner,
+    pack_events,
+    scan_events,
+)
 
 
 PUBLIC_ID = PublicId.from_str("dvilela/olas_tokenomics:0.1.0")
@@ -50,50 +56,32 @@ class OlasTokenomicsContract(Contract):
         from_block: int,
         to_block: Union[int, str] = "latest",
         chain_name: str = "ethereum",
+        fields: Optional[List[str]] = None,
+        rpc_urls: Optional[List[str]] = None,
+        rpc_limits: Optional[Dict[str, Any]] = None,
     ) -> Optional[JSONLike]:
-        """Get events."""
-        contract_instance = cls.get_instance(ledger_api, contract_address)
-
-        # Avoid parsing too many blocks at a time. This might take too long and
-        # the connection could time out.
-        MAX_BLOCKS = 5000
-
-        to_block = (
-            ledger_api.api.eth.get_block_number() - 1
-            if to_block == "latest"
-            else to_block
+        """Get events, packed with only the given arguments, or all of them."""
+        scanner = get_event_scanner(
+            str(cls.contract_id),
+            chain_name,
+            contract_address,
+            cls.contract_interface.get(ledger_api.identifier, {})["abi"],
+        )
+        result = scan_events(
+            ledger_api,
+            chain_name,
+            [(scanner, [event_name])],
+            from_block,
+            to_block,
+            rpc_pool=get_rpc_pool(ledger_api, chain_name, rpc_urls, rpc_limits),
         )
 
-        ranges: List[int] = list(range(from_block, cast(int, to_block), MAX_BLOCKS)) + [
-            cast(int, to_block)
-        ]
-
-        event = getattr(contract_instance.events, event_name)
-        events = []
-        for i in range(len(ranges) - 1):
-            from_block = ranges[i]
-            to_block = ranges[i + 1]
-            new_events = []
-
-            while True:
-                try:
-                    new_events = event.create_filter(
-                        fromBlock=from_block,  # exclusive
-                        toBlock=to_block,  # inclusive
-                    ).get_all_entries()  # limited to 10k entries for now
-                    break
-                # Gnosis RPCs sometimes returns:
-                # ValueError: Filter with id: x does not exist
-                # MismatchedABI: The event signature did not match the provided ABI
-                # Retrying several times makes it work
-                except ValueError as e:
-                    _logger.error(e)
-                except MismatchedABI as e:
-                    _logger.error(e)
-
-            events += new_events
+        # Report the failure and the last fully scanned block so the caller can resume
+        if "error" in result:
+            result["error"] = f"Error getting {event_name} events: {result['error']}"
 
-        return dict(
-            events=events,
-            latest_block=int(to_block),
+        result["events"] = pack_events(
+            result["events"], {event_name: fields} if fields else None
         )
+
+        return result
@@ -24,11 +24,26 @@ import random
 import re
 import secrets
 from abc import ABC
-from collections import Counter
+from collections import Counter, deque
 from datetime import datetime, timedelta
-from typing import Any, Dict, Generator, List, Optional, Set, Tuple, Type, Union, cast
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
 
 from aea.protocols.base import Message
+from aea.protocols.dialogue.base import Dialogue
 from twitter_text import parse_tweet  # type: ignore
 
 from packages.dvilela.connections.kv_store.connection import (
@@ -43,10 +58,9 @@ from packages.dvilela.connections.suno.connection import (
 from packages.dvilela.connections.twikit.connection import (
     PUBLIC_ID as TWIKIT_CONNECTION_PUBLIC_ID,
 )
+from packages.dvilela.contracts.olas_events.contract import OlasEventsContract
+from packages.dvilela.contracts.olas_events.scanner import unpack_events
 from packages.dvilela.contracts.olas_registries.contract import OlasRegistriesContract
-from packages.dvilela.contracts.olas_tokenomics.contract import OlasTokenomicsContract
-from packages.dvilela.contracts.olas_treasury.contract import OlasTreasuryContract
-from packages.dvilela.contracts.veolas.contract import veOLASContract
 from packages.dvilela.protocols.kv_store.dialogues import (
     KvStoreDialogue,
     KvStoreDialogues,
@@ -56,9 +70,14 @@ from packages.dvilela.skills.tsunami_abci.dialogues import (
     TwitterDialogue,
     TwitterDialogues,
 )
-from packages.dvilela.skills.tsunami_abci.models import Params
+from packages.dvilela.skills.tsunami_abci.models import (
+    GatewayPool,
+    MetadataCache,
+    Params,
+    PipelineStats,
+    get_metadata_cache_key,
+)
 from packages.dvilela.skills.tsunami_abci.prompts import (
-    EVENT_USER_PROMPT_TEMPLATES,
     MUSIC_GENRES,
     OMEN_USER_PROMPT,
     PROPOSAL_CLOSED_USER_PROMPT,
@@ -90,6 +109,7 @@ from packages.dvilela.skills.tsunami_abci.subgraph import (
     OMEN_XDAI_TRADES_QUERY,
     PACKAGE_QUERY,
 )
+from packages.dvilela.skills.tsunami_abci.tracked_events import TRACKED_CONTRACTS
 from packages.valory.connections.farcaster.connection import (
     PUBLIC_ID as FARCASTER_CONNECTION_PUBLIC_ID,
 )
@@ -97,11 +117,11 @@ from packages.valory.connections.twitter.connection import (
     PUBLIC_ID as TWITTER_CONNECTION_PUBLIC_ID,
 )
 from packages.valory.protocols.contract_api import ContractApiMessage
-from packages.valory.protocols.ledger_api import LedgerApiMessage
 from packages.valory.protocols.srr.dialogues import SrrDialogue, SrrDialogues
 from packages.valory.protocols.srr.message import SrrMessage
 from packages.valory.protocols.twitter.message import TwitterMessage
 from packages.valory.skills.abstract_round_abci.base import AbstractRound
+from packages.valory.skills.abstract_round_abci.behaviour_utils import TimeoutException
 from packages.valory.skills.abstract_round_abci.behaviours import (
     AbstractRoundBehaviour,
     BaseBehaviour,
@@ -112,6 +132,7 @@ from packages.valory.skills.abstract_round_abci.models import Requests
 MAX_TWEET_ATTEMPTS = 5
 TWEET_ATTEMPTS_SUMMARIZE = 3
 MAX_TWEET_CHARS = 280
+DIGEST_NEWEST_UNITS = 3
 HTTP_OK = 200
 OLAS_REGISTRY_URL = "https://registry.olas.network"
 GITHUB_REPO_LATEST_URL = "https://api.github.com/repos/{repo}/releases/latest"
@@ -121,6 +142,7 @@ OMEN_RUN_HOUR = 15
 SUNO_RUN_HOUR = 10
 SUNO_RUN_DAY = 4
 TWITTER_PIC_URL = r"pic\.twitter\.com\S+"
+OLAS_HASHTAG = " #OlasNetwork"
 
 TRACKED_REPOS = [
     "dvilelaf/tsunami",
@@ -148,6 +170,32 @@ def tweet_len(tweet: str) -> int:
     return parse_tweet(tweet).asdict()["weightedLength"]
 
 
+def get_tweet_budget(
+    header: Optional[str] = None, footer: Optional[str] = None
+) -> Optional[int]:
+    """Get how many characters Llama can write so the tweet still fits with its header, hashtag and footer"""
+    budget = (
+        MAX_TWEET_CHARS - 1 - tweet_len((header or "") + OLAS_HASHTAG + (footer or ""))
+    )
+    return budget if budget > 0 else None
+
+
+def get_unit_id_arg(contract_name: str) -> Optional[str]:
+    """Get the event argument that holds the unit id, for the registry contracts"""
+    if not contract_name.endswith("_registry"):
+        return None
+    return "serviceId" if contract_name == "service_registry" else "unitId"
+
+
+def get_work_item_id(chain_id: str, item: Dict) -> str:
+    """Get an id for the event or the digest of events of a work item"""
+    if "events" in item:
+        event = item["events"][0]
+        return f"{chain_id}:digest:{len(item['events'])}:{event.transaction_hash}:{event.log_index}"
+    event = item["event"]
+    return f"{chain_id}:{event.transaction_hash}:{event.log_index}"
+
+
 def tweet_to_thread(tweet: str) -> Optional[List[str]]:
     """Create a thread from a long text"""
 
@@ -226,79 +274,63 @@ def tweet_to_thread(tweet: str) -> Optional[List[str]]:
     return thread
 
 
-class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ancestors
+class TsunamiBaseBehaviour(  # pylint: disable=too-many-ancestors,too-many-public-methods
+    BaseBehaviour, ABC
+):
     """Base behaviour for the tsunami_abci skill."""
 
     def __init__(self, **kwargs: Any):
         """Init"""
         super().__init__(**kwargs)
 
+        # Resolve the addresses and thread builders of the tracked contracts
         self.tracked_events = {
-            "ethereum": {
-                "service_registry": {
-                    "contract_id": str(OlasRegistriesContract.contract_id),
-                    "contract_address": self.params.service_registry_address_ethereum,
-                    "event_to_template": {
-                        "CreateService": EVENT_USER_PROMPT_TEMPLATES["service_minted"],
-                    },
-                    "build_thread_function": self.build_registry_tweet,
-                },
-                "agent_registry": {
-                    "contract_id": str(OlasRegistriesContract.contract_id),
-                    "contract_address": self.params.agent_registry_address_ethereum,
-                    "event_to_template": {
-                        "CreateUnit": EVENT_USER_PROMPT_TEMPLATES["agent_minted"]
-                    },
-                    "build_thread_function": self.build_registry_tweet,
-                },
-                "component_registry": {
-                    "contract_id": str(OlasRegistriesContract.contract_id),
-                    "contract_address": self.params.component_registry_address_ethereum,
-                    "event_to_template": {
-                        "CreateUnit": EVENT_USER_PROMPT_TEMPLATES["component_minted"]
-                    },
-                    "build_thread_function": self.build_registry_tweet,
-                },
-                "tokenomics": {
-                    "contract_id": str(OlasTokenomicsContract.contract_id),
-                    "contract_address": self.params.tokenomics_address_ethereum,
-                    "event_to_template": {
-                        "EpochSettled": EVENT_USER_PROMPT_TEMPLATES["epoch_settled"]
-                    },
-                    "build_thread_function": self.build_tokenomics_tweet,
-                },
-                "treasury": {
-                    "contract_id": str(OlasTreasuryContract.contract_id),
-                    "contract_address": self.params.treasury_address_ethereum,
-                    "event_to_template": {
-                        "DonateToServicesETH": EVENT_USER_PROMPT_TEMPLATES[
-                            "donation_sent"
-                        ]
-                    },
-                    "build_thread_function": self.build_treasury_tweet,
-                },
-                "veolas": {
-                    "contract_id": str(veOLASContract.contract_id),
-                    "contract_address": self.params.veolas_address_ethereum,
-                    "event_to_template": {
-                        "Deposit": EVENT_USER_PROMPT_TEMPLATES["olas_locked"],
-                        "Withdraw": EVENT_USER_PROMPT_TEMPLATES["olas_unlocked"],
-                    },
-                    "build_thread_function": self.build_veolas_tweet,
-                },
-            },
-            "gnosis": {
-                "service_registry": {
-                    "contract_id": str(OlasRegistriesContract.contract_id),
-                    "contract_address": self.params.service_registry_address_gnosis,
-                    "event_to_template": {
-                        "CreateService": EVENT_USER_PROMPT_TEMPLATES["service_minted"],
-                    },
-                    "build_thread_function": self.build_registry_tweet,
-                },
-            },
+            chain_id: {
+                contract_name: {
+                    "contract_id": contract_data["contract_id"],
+                    "contract_address": getattr(
+                        self.params, contract_data["address_param"]
+                    ),
+                    "event_to_template": contract_data["event_to_template"],
+                    "event_to_fields": contract_data["event_to_fields"],
+                    "build_thread_function": getattr(
+                        self, contract_data["build_thread_function"]
+                    ),
+                    "build_prompt_function": getattr(
+                        self, contract_data["build_prompt_function"]
+                    ),
+                    "event_to_digest_template": contract_data.get(
+                        "event_to_digest_template", {}
+                    ),
+                    "build_digest_function": (
+                        getattr(self, contract_data["build_digest_function"])
+                        if "build_digest_function" in contract_data
+                        else None
+                    ),
+                    "build_digest_prompt_function": (
+                        getattr(self, contract_data["build_digest_prompt_function"])
+                        if "build_digest_prompt_function" in contract_data
+                        else None
+                    ),
+                }
+                for contract_name, contract_data in contracts.items()
+            }
+            for chain_id, contracts in TRACKED_CONTRACTS.items()
         }
 
+        # Requests that have been sent without waiting, and their responses
+        self._dispatching = False
+        self._dispatched_responses: Dict[str, Message] = {}
+        self._abandoned_nonces: Set[str] = set()
+
+        # Token uris prefetched for a batch of registry events, by contract address and unit id
+        self._token_uris: Dict[Tuple[str, int], str] = {}
+
+        # First Llama responses generated for a batch of threads, by user prompt, with
+        # their system prompt. While collecting, build_thread only records the user prompts
+        # and their length budgets.
+        self._thread_drafts: Dict[str, Tuple[str, str, Dict]] = {}
+
     @property
     def synchronized_data(self) -> SynchronizedData:
         """Return the synchronized data."""
@@ -487,13 +519,32 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
         self,
         system_prompt: str,
         user_prompt: str,
+        max_chars: Optional[int] = None,
     ) -> Generator[None, None, SrrMessage]:
         """Send a request message from the skill context."""
+        payload: Dict[str, Any] = {"system": system_prompt, "user": user_prompt}
+        if max_chars is not None:
+            payload["max_chars"] = max_chars
         srr_dialogues = cast(SrrDialogues, self.context.srr_dialogues)
         srr_message, srr_dialogue = srr_dialogues.create(
             counterparty=str(LLAMA_CONNECTION_PUBLIC_ID),
             performative=SrrMessage.Performative.REQUEST,
-            payload=json.dumps({"system": system_prompt, "user": user_prompt}),
+            payload=json.dumps(payload),
+        )
+        srr_message = cast(SrrMessage, srr_message)
+        srr_dialogue = cast(SrrDialogue, srr_dialogue)
+        response = yield from self._do_connection_request(srr_message, srr_dialogue)  # type: ignore
+        return response  # type: ignore
+
+    def _call_llama_batch(
+        self, requests: List[Dict[str, Any]]
+    ) -> Generator[None, None, SrrMessage]:
+        """Send several chat completion requests in a single message."""
+        srr_dialogues = cast(SrrDialogues, self.context.srr_dialogues)
+        srr_message, srr_dialogue = srr_dialogues.create(
+            counterparty=str(LLAMA_CONNECTION_PUBLIC_ID),
+            performative=SrrMessage.Performative.REQUEST,
+            payload=json.dumps({"requests": requests}),
         )
         srr_message = cast(SrrMessage, srr_message)
         srr_dialogue = cast(SrrDialogue, srr_dialogue)
@@ -574,17 +625,204 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
         response = yield from self.wait_for_message(timeout=timeout)
         return response
 
+    def _do_request(
+        self,
+        request_message: Message,
+        dialogue: Dialogue,
+        timeout: Optional[float] = None,
+    ) -> Generator[None, None, Any]:
+        """Do a request and wait the response, or just send it while dispatching."""
+
+        if not self._dispatching:
+            response = yield from super()._do_request(
+                request_message, dialogue, timeout
+            )
+            return response
+
+        self.context.outbox.put_message(message=request_message)
+        request_nonce = self._get_request_nonce_from_dialogue(dialogue)
+        cast(Requests, self.context.requests).request_id_to_callback[request_nonce] = (
+            self._get_dispatch_callback(request_nonce)
+        )
+        return request_nonce
+
+    def _get_dispatch_callback(
+        self, request_nonce: str
+    ) -> Callable[[Message, BaseBehaviour], None]:
+        """Get a callback that stores the response to a dispatched request."""
+
+        def callback(
+            message: Message,
+            current_behaviour: BaseBehaviour,  # pylint: disable=unused-argument
+        ) -> None:
+            """Store the response, unless nobody is waiting for it anymore."""
+            if request_nonce in self._abandoned_nonces:
+                self._abandoned_nonces.discard(request_nonce)
+                return
+            self._dispatched_responses[request_nonce] = message
+
+        return callback
+
+    def abandon(self, request_nonces: Iterable[str]) -> None:
+        """Stop waiting for dispatched requests. Their responses are dropped when they arrive."""
+        for nonce in request_nonces:
+            if self._dispatched_responses.pop(nonce, None) is None:
+                self._abandoned_nonces.add(nonce)
+
+    def dispatch(self, request: Generator) -> Generator[None, None, str]:
+        """Send a request without waiting for its response. Returns the request nonce."""
+        self._dispatching = True
+        try:
+            request_nonce = yield from request
+        finally:
+            self._dispatching = False
+        return request_nonce
+
+    def gather(
+        self, request_nonces: List[str], timeout: Optional[float] = None
+    ) -> Generator[None, None, List[Optional[Message]]]:
+        """Wait for the responses to several dispatched requests, in order."""
+        try:
+            yield from self.wait_for_condition(
+                lambda: all(
+                    nonce in self._dispatched_responses for nonce in request_nonces
+                ),
+                timeout=timeout,
+            )
+        except TimeoutException:
+            self.context.logger.error(
+                f"Timed out while waiting for {len(request_nonces)} responses"
+            )
+        responses = [
+            self._dispatched_responses.pop(nonce, None) for nonce in request_nonces
+        ]
+        self.abandon(
+            nonce
+            for nonce, response in zip(request_nonces, responses)
+            if response is None
+        )
+        return responses
+
+    def get_hedged_http_responses(  # pylint: disable=too-many-locals,too-many-statements
+        self,
+        uris: List[str],
+        limit: int,
+        timeout: Optional[float] = None,
+    ) -> Generator[None, None, List[Optional[Message]]]:
+        """
+        Download several uris, at most limit at a time, hedging IPFS uris across the gateway pool.
+
+        Every uri is requested from its fastest gateway first. If it has not answered
+        within its latency percentile, or it fails, the next gateway is tried as well.
+        The first successful response wins.
+
+        :param uris: the uris to download.
+        :param limit: the maximum number of uris being downloaded at the same time.
+        :param timeout: the overall timeout in seconds.
+        :return: the responses, in the same order as the uris. None if all the attempts failed.
+        """
+        gateway_pool = cast(GatewayPool, self.context.gateway_pool)
+        candidates = [gateway_pool.get_urls(uri) for uri in uris]
+        next_candidate = [0] * len(uris)
+        hedge_at = [0.0] * len(uris)
+        responses: List[Optional[Message]] = [None] * len(uris)
+
+        # In flight attempts: request nonce -> uri index, gateway and start time
+        attempts: Dict[str, Tuple[int, Optional[str], float]] = {}
+        finished: Set[int] = set()
+        next_uri = 0
+        deadline = datetime.now().timestamp() + timeout if timeout else None
+
+        def is_due(i: int) -> bool:
+            """Check whether the next gateway for an uri should be tried now"""
+            return (
+                next_candidate[i] < len(candidates[i])
+                and datetime.now().timestamp() >= hedge_at[i]
+            )
+
+        while len(finished) < len(uris):
+            # Start new uris while under the limit
+            while next_uri < len(uris) and next_uri - len(finished) < limit:
+                next_uri += 1
+
+            active = [i for i in range(next_uri) if i not in finished]
+
+            # Send the first attempts and the hedged ones
+            for i in active:
+                if not is_due(i):
+                    continue
+                gateway, url = candidates[i][next_candidate[i]]
+                next_candidate[i] += 1
+                request_nonce = yield from self.dispatch(
+                    self.get_http_response(method="GET", url=url)
+                )
+                now = datetime.now().timestamp()
+                attempts[request_nonce] = (i, gateway, now)
+                hedge_at[i] = now + gateway_pool.hedge_delay(gateway)
+
+            yield from self.wait_for_condition(
+                lambda: any(nonce in self._dispatched_responses for nonce in attempts)
+                or any(is_due(i) for i in active)
+                or (deadline is not None and datetime.now().timestamp() > deadline)
+            )
+
+            now = datetime.now().timestamp()
+            for request_nonce in list(attempts):
+                if request_nonce not in self._dispatched_responses:
+                    continue
+                i, gateway, start = attempts.pop(request_nonce)
+                response = self._dispatched_responses.pop(request_nonce)
+                success = response.status_code == HTTP_OK  # type: ignore
+                gateway_pool.record(gateway, now - start, success)
+                if not success:
+                    hedge_at[i] = now
+                    continue
+                responses[i] = response
+                finished.add(i)
+                # The slower attempts took at least this long. Their responses are dropped.
+                for nonce, (j, slow_gateway, slow_start) in list(attempts.items()):
+                    if j == i:
+                        gateway_pool.record(slow_gateway, now - slow_start, True)
+                        del attempts[nonce]
+                        self.abandon([nonce])
+
+            # Uris with nothing in flight and no gateways left have failed
+            for i in active:
+                if (
+                    i not in finished
+                    and next_candidate[i] >= len(candidates[i])
+                    and all(j != i for j, _, _ in attempts.values())
+                ):
+                    finished.add(i)
+
+            if deadline is not None and now > deadline:
+                self.context.logger.error(
+                    f"Timed out with {len(uris) - len(finished)} of {len(uris)} downloads pending"
+                )
+                self.abandon(attempts)
+                break
+
+        return responses
+
     def build_thread(
         self,
         user_prompt: str,
         header: Optional[str] = None,
         footer: Optional[str] = None,
+        draft: Optional[Tuple[str, str, Dict]] = None,
     ) -> Generator[None, None, Optional[List[str]]]:
         """Build thread"""
 
-        # Randomly select a personality
+        # Llama only gets the characters left by the additions below
+        max_chars = get_tweet_budget(header, footer)
+
+        # Randomly select a personality, or the one of the drafted response
         # TODO: this only works for a single agent
-        system_prompt_base = secrets.choice(SYSTEM_PROMPTS)  # nosec
+        draft_json: Optional[Dict] = None
+        if draft is not None and draft[1] == user_prompt:
+            system_prompt_base, _, draft_json = draft
+        else:
+            system_prompt_base = secrets.choice(SYSTEM_PROMPTS)  # nosec
         self.context.logger.info("Llama is building a tweet...")
 
         attempts = 0
@@ -596,26 +834,22 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
             if attempts >= TWEET_ATTEMPTS_SUMMARIZE:
                 system_prompt += SYSTEM_PROMPT_SUMMARIZER
 
-            # Call llama conection
-            response = yield from self._call_llama(
-                system_prompt=system_prompt, user_prompt=user_prompt
+            # Only the first attempt can use the drafted response
+            tweet_attempt = yield from self.get_llama_tweet(
+                system_prompt, user_prompt, max_chars, draft_json
             )
-
-            response_json = json.loads(response.payload)
-
-            if "error" in response_json:
-                self.context.logger.error(response_json["error"])
+            draft_json = None
+            if tweet_attempt is None:
+                attempts += 1
                 continue
 
-            tweet_attempt = response_json["response"]
-
             # Add header
             if header:
                 tweet_attempt = header + tweet_attempt
 
             # Add Contribute's hashtag
-            if "#OlasNetwork" not in tweet_attempt:
-                tweet_attempt += " #OlasNetwork"
+            if OLAS_HASHTAG.strip() not in tweet_attempt:
+                tweet_attempt += OLAS_HASHTAG
 
             # Add footer
             if footer:
@@ -653,11 +887,152 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
 
         return thread
 
+    def get_llama_tweet(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_chars: Optional[int],
+        draft_json: Optional[Dict] = None,
+    ) -> Generator[None, None, Optional[str]]:
+        """Get a tweet from Llama, or from the drafted response. None if it failed or could not fit."""
+
+        # Call llama conection, unless the response has already been drafted
+        if draft_json is not None:
+            response_json = draft_json
+        else:
+            response = yield from self._call_llama(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                max_chars=max_chars,
+            )
+            response_json = json.loads(response.payload)
+
+        if "error" in response_json:
+            self.context.logger.error(response_json["error"])
+            return None
+
+        # Llama stopped early because the answer could not fit the tweet
+        if response_json.get("too_long"):
+            self.context.logger.error(
+                f"Tweet is too long, generation aborted: {response_json['response']}"
+            )
+            return None
+
+        if response_json.get("truncated"):
+            self.context.logger.info(
+                "Llama response was trimmed to its last sentence within the budget"
+            )
+        return response_json["response"]
+
+    def draft_threads(
+        self, work_items: List[Tuple[str, Dict]]
+    ) -> Generator[None, None, None]:
+        """Generate the first Llama response for several work items with a single batch request"""
+
+        # The prompts only use the prefetched data, so drafting has no side effects
+        prompts = []
+        for chain_id, item in work_items:
+            work_item_id = get_work_item_id(chain_id, item)
+            if work_item_id in self._thread_drafts:
+                continue
+            user_prompt = self.get_work_item_prompt(chain_id, item)
+            if user_prompt is not None:
+                prompts.append((work_item_id, user_prompt))
+        if not prompts:
+            return
+
+        # Every draft gets a random personality, like the threads built one by one.
+        # The work item threads have no header or footer.
+        system_prompts = [secrets.choice(SYSTEM_PROMPTS) for _ in prompts]  # nosec
+        max_chars = get_tweet_budget()
+        self.context.logger.info(f"Llama is drafting {len(prompts)} tweets...")
+        response = yield from self._call_llama_batch(
+            [
+                (
+                    {"system": system_prompt, "user": user_prompt}
+                    if max_chars is None
+                    else {
+                        "system": system_prompt,
+                        "user": user_prompt,
+                        "max_chars": max_chars,
+                    }
+                )
+                for system_prompt, (_, user_prompt) in zip(system_prompts, prompts)
+            ]
+        )
+
+        response_json = json.loads(response.payload)
+        if "responses" not in response_json:
+            self.context.logger.error(
+                f"Error while drafting tweets: {response_json.get('error')}"
+            )
+            return
+
+        for system_prompt, (work_item_id, user_prompt), draft_json in zip(
+            system_prompts, prompts, response_json["responses"]
+        ):
+            self._thread_drafts[work_item_id] = (system_prompt, user_prompt, draft_json)
+
+    def get_work_item_prompt(self, chain_id: str, item: Dict) -> Optional[str]:
+        """Get the user prompt of a work item from the prefetched data, if it is there"""
+        contract_name = item["contract_name"]
+        event_name = item["event_name"]
+        contract_data = self.tracked_events[chain_id][contract_name]
+        events = (
+            item["events"][-DIGEST_NEWEST_UNITS:]
+            if "events" in item
+            else [item["event"]]
+        )
+
+        # Registry events need the metadata of their units
+        unit_metadata = {}
+        unit_id_arg = get_unit_id_arg(contract_name)
+        if unit_id_arg is not None:
+            metadata_cache = cast(MetadataCache, self.context.metadata_cache)
+            for event in events:
+                unit_id = event.args[unit_id_arg]
+                uri = self._token_uris.get(
+                    (contract_data["contract_address"].lower(), int(unit_id))
+                )
+                metadata = (
+                    metadata_cache.get(get_metadata_cache_key(uri)[0]) if uri else None
+                )
+                if metadata is not None:
+                    unit_metadata[unit_id] = metadata
+
+        if "events" in item:
+            return contract_data["build_digest_prompt_function"](
+                chain_id,
+                contract_name,
+                item["events"],
+                contract_data["event_to_digest_template"][event_name],
+                unit_metadata,
+            )
+        return contract_data["build_prompt_function"](
+            chain_id,
+            contract_name,
+            item["event"],
+            contract_data["event_to_template"][event_name],
+            unit_metadata,
+        )
+
+    def get_rpc_limits(self) -> Dict[str, Any]:
+        """Get the RPC request rate and the request budget of the current period, shared by all the contract calls"""
+        return dict(
+            requests_per_second=self.params.rpc_requests_per_second,
+            requests_per_period=self.params.rpc_requests_per_period,
+            period=self.synchronized_data.period_count,
+        )
+
     def get_token_uri(
         self, chain_id: str, contract_id: str, contract_address: str, unit_id: str
     ) -> Generator[None, None, Optional[str]]:
         """Get registries events"""
 
+        prefetched_uri = self._token_uris.get((contract_address.lower(), int(unit_id)))
+        if prefetched_uri:
+            return prefetched_uri
+
         self.context.logger.info(
             f"Retrieving uri for unit_id {unit_id} on contract {chain_id}::{contract_id}::{contract_address}"
         )
@@ -668,7 +1043,10 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
             contract_id=contract_id,
             contract_callable="get_token_uri",
             unit_id=unit_id,
+            chain_name=chain_id,
             chain_id=chain_id,
+            rpc_urls=self.params.rpc_endpoints.get(chain_id),
+            rpc_limits=self.get_rpc_limits(),
         )
 
         if contract_api_msg.performative != ContractApiMessage.Performative.STATE:
@@ -683,6 +1061,199 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
 
         return uri
 
+    def prefetch_token_uris(  # pylint: disable=too-many-locals
+        self, chain_id: str, events: List
+    ) -> Generator[None, None, None]:
+        """Get the token uris for all the registry events of a chain, with one multicall per registry"""
+
+        registries = {
+            contract_name: contract_data
+            for contract_name, contract_data in self.tracked_events[chain_id].items()
+            if contract_data["contract_id"] == str(OlasRegistriesContract.contract_id)
+        }
+
+        unit_ids: Dict[str, List[int]] = {}
+        for contract_name, contract_data in registries.items():
+            unit_type = "service" if contract_name == "service_registry" else "unit"
+            contract_address = contract_data["contract_address"].lower()
+            unit_ids[contract_name] = sorted(
+                {
+                    int(event.args[f"{unit_type}Id"])
+                    for event in events
+                    if event.address.lower() == contract_address
+                    and event.event in contract_data["event_to_template"]
+                }
+                - {
+                    unit_id
+                    for address, unit_id in self._token_uris
+                    if address == contract_address
+                }
+            )
+
+        contract_names = [name for name in registries if unit_ids[name]]
+        if not contract_names:
+            return
+
+        self.context.logger.info(f"Prefetching token uris on {chain_id}: {unit_ids}")
+
+        # One request per registry, all of them at once
+        request_nonces = []
+        for contract_name in contract_names:
+            request_nonce = yield from self.dispatch(
+                self.get_contract_api_response(
+                    performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
+                    contract_address=registries[contract_name]["contract_address"],
+                    contract_id=str(OlasRegistriesContract.contract_id),
+                    contract_callable="get_token_uris",
+                    unit_ids=unit_ids[contract_name],
+                    chain_name=chain_id,
+                    chain_id=chain_id,
+                    rpc_urls=self.params.rpc_endpoints.get(chain_id),
+                    rpc_limits=self.get_rpc_limits(),
+                )
+            )
+            request_nonces.append(request_nonce)
+
+        contract_api_msgs = yield from self.gather(
+            request_nonces, timeout=self.params.round_timeout_seconds
+        )
+
+        for contract_name, contract_api_msg in zip(contract_names, contract_api_msgs):
+            if (
+                contract_api_msg is None
+                or contract_api_msg.performative
+                != ContractApiMessage.Performative.STATE
+            ):
+                self.context.logger.error(
+                    f"Error prefetching the token uris for {contract_name} [{contract_api_msg}]"
+                )
+                continue
+
+            contract_address = registries[contract_name]["contract_address"].lower()
+            uris = cast(dict, cast(ContractApiMessage, contract_api_msg).state.body)[
+                "result"
+            ]
+            for unit_id, uri in zip(unit_ids[contract_name], uris):
+                if uri:
+                    self._token_uris[(contract_address, unit_id)] = uri
+
+    def get_token_metadata(self, uri: str) -> Generator[None, None, Optional[Dict]]:
+        """Get the token metadata from the cache, the db or the uri, in that order"""
+        metadata_cache = cast(MetadataCache, self.context.metadata_cache)
+        key, immutable = get_metadata_cache_key(uri)
+
+        metadata = metadata_cache.get(key)
+        if metadata is not None:
+            metadata_cache.counters["memory_hits"] += 1
+            return metadata
+
+        db_key = f"metadata_{key}"
+        db_data = yield from self._read_kv(keys=(db_key,))
+        if db_data and db_data[db_key]:
+            entry = json.loads(db_data[db_key])
+            if metadata_cache.is_fresh(entry["timestamp"], immutable):
+                metadata_cache.counters["store_hits"] += 1
+                metadata_cache.put(key, entry["data"], immutable, entry["timestamp"])
+                return entry["data"]
+
+        metadata_cache.counters["misses"] += 1
+
+        self.context.logger.info("Getting token data...")
+        response = (
+            yield from self.get_hedged_http_responses(
+                [uri], limit=1, timeout=self.params.round_timeout_seconds
+            )
+        )[0]
+
+        if response is None:
+            self.context.logger.error(
+                f"Error while download token data from {uri}: {response}"  # type: ignore
+            )
+            return None
+
+        metadata = json.loads(response.body)  # type: ignore
+        self.context.logger.info(f"Got token data: {metadata}")
+
+        timestamp = datetime.now().timestamp()
+        metadata_cache.put(key, metadata, immutable, timestamp)
+        yield from self._write_kv(
+            {db_key: json.dumps({"data": metadata, "timestamp": timestamp})}
+        )
+
+        return metadata
+
+    def prefetch_token_metadata(  # pylint: disable=too-many-locals
+        self, chain_id: str, events: List
+    ) -> Generator[None, None, None]:
+        """Get the metadata for all the registry events of a chain before building any thread"""
+        metadata_cache = cast(MetadataCache, self.context.metadata_cache)
+
+        # Metadata that is not in memory yet, by cache key
+        uris: Dict[str, Tuple[str, bool]] = {}
+        for contract_data in self.tracked_events[chain_id].values():
+            if contract_data["contract_id"] != str(OlasRegistriesContract.contract_id):
+                continue
+            contract_address = contract_data["contract_address"].lower()
+            for event in events:
+                if event.address.lower() != contract_address:
+                    continue
+                unit_id = event.args.get("serviceId", event.args.get("unitId"))
+                uri = self._token_uris.get((contract_address, int(unit_id)))
+                if uri is None:
+                    continue
+                key, immutable = get_metadata_cache_key(uri)
+                if metadata_cache.get(key) is None:
+                    uris[key] = (uri, immutable)
+
+        if not uris:
+            return
+
+        # Load what is in the db with a single read
+        db_data = yield from self._read_kv(
+            keys=tuple(f"metadata_{key}" for key in uris)  # type: ignore
+        )
+        for key, (_, immutable) in list(uris.items()):
+            value = (db_data or {}).get(f"metadata_{key}")
+            if not value:
+                continue
+            entry = json.loads(value)
+            if metadata_cache.is_fresh(entry["timestamp"], immutable):
+                metadata_cache.counters["store_hits"] += 1
+                metadata_cache.put(key, entry["data"], immutable, entry["timestamp"])
+                del uris[key]
+
+        if not uris:
+            return
+
+        # Download the rest concurrently
+        self.context.logger.info(
+            f"Downloading the metadata of {len(uris)} units on {chain_id}"
+        )
+        keys = list(uris.keys())
+        responses = yield from self.get_hedged_http_responses(
+            [uris[key][0] for key in keys],
+            limit=self.params.metadata_download_concurrency,
+            timeout=self.params.round_timeout_seconds,
+        )
+
+        timestamp = datetime.now().timestamp()
+        db_entries = {}
+        for key, response in zip(keys, responses):
+            metadata_cache.counters["misses"] += 1
+            if response is None or response.status_code != HTTP_OK:  # type: ignore
+                self.context.logger.error(
+                    f"Error while download token data from {uris[key][0]}: {response}"
+                )
+                continue
+            metadata = json.loads(response.body)  # type: ignore
+            metadata_cache.put(key, metadata, uris[key][1], timestamp)
+            db_entries[f"metadata_{key}"] = json.dumps(
+                {"data": metadata, "timestamp": timestamp}
+            )
+
+        if db_entries:
+            yield from self._write_kv(db_entries)
+
     def build_registry_tweet(  # pylint: disable=too-many-arguments,too-many-locals
         self,
         chain_id: str,
@@ -692,6 +1263,7 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
         event_name: str,
         event: Any,
         event_template: str,
+        draft: Optional[Tuple[str, str, Dict]] = None,
     ) -> Generator[None, None, Tuple[Optional[List[str]], Optional[str]]]:
         """Build a thread for a registry event"""
 
@@ -702,14 +1274,7 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
 
         self.context.logger.info(f"Processing registry event {event}")
 
-        unit_id = getattr(event.args, f"{unit_type}Id")
-
-        kwargs = {
-            "unit_id": unit_id,
-            "chain_name": chain_id,
-        }
-
-        user_prompt = event_template.format(**kwargs)
+        unit_id = event.args[f"{unit_type}Id"]
 
         # Get token URI
         uri = yield from self.get_token_uri(
@@ -723,29 +1288,53 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
             return None, None
 
         # Get unit data
-        self.context.logger.info("Getting token data...")
-        response = yield from self.get_http_response(  # type: ignore
-            method="GET", url=uri
-        )
+        response_json = yield from self.get_token_metadata(uri)
 
-        if response.status_code != HTTP_OK:  # type: ignore
+        if response_json is None:
             self.context.logger.error(
-                f"Error while download token data: {response}\n. Skipping event {chain_id}:{contract_name}:{event_name}:{event}...\n{response}"  # type: ignore
+                f"Error while download token data. Skipping event {chain_id}:{contract_name}:{event_name}:{event}..."
             )
             return None, None
 
-        response_json = json.loads(response.body)  # type: ignore
-        self.context.logger.info(f"Got token data: {response_json}")
-
-        unit_name = response_json["name"]
-        unit_description = response_json["description"]
-        user_prompt += f" The {unit_type}'s name is {unit_name}. Its description is: {unit_description}'"
+        user_prompt = cast(
+            str,
+            self.get_registry_prompt(
+                chain_id, contract_name, event, event_template, {unit_id: response_json}
+            ),
+        )
         unit_url = f"{OLAS_REGISTRY_URL}/{chain_id}/{component_type}s/{unit_id}"
 
-        thread = yield from self.build_thread(user_prompt)
+        thread = yield from self.build_thread(user_prompt, draft=draft)
 
         return thread, unit_url
 
+    @staticmethod
+    def get_registry_prompt(
+        chain_id: str,
+        contract_name: str,
+        event: Any,
+        event_template: str,
+        unit_metadata: Dict,
+    ) -> Optional[str]:
+        """Get the user prompt for a registry event. It needs the unit metadata."""
+
+        unit_type = "service" if contract_name == "service_registry" else "unit"
+        unit_id = event.args[f"{unit_type}Id"]
+        metadata = unit_metadata.get(unit_id)
+        if metadata is None:
+            return None
+
+        kwargs = {
+            "unit_id": unit_id,
+            "chain_name": chain_id,
+        }
+
+        user_prompt = event_template.format(**kwargs)
+        unit_name = metadata["name"]
+        unit_description = metadata["description"]
+        user_prompt += f" The {unit_type}'s name is {unit_name}. Its description is: {unit_description}'"
+        return user_prompt
+
     def build_tokenomics_tweet(  # pylint: disable=too-many-arguments,too-many-locals,unused-argument
         self,
         chain_id: str,
@@ -755,21 +1344,39 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
         event_name: str,
         event: Any,
         event_template: str,
+        draft: Optional[Tuple[str, str, Dict]] = None,
     ) -> Generator[None, None, Tuple[Optional[List[str]], Optional[str]]]:
         """Build a thread for a tokenomics event"""
 
         self.context.logger.info(f"Processing tokenomics event {event}")
 
+        user_prompt = cast(
+            str,
+            self.get_tokenomics_prompt(
+                chain_id, contract_name, event, event_template, {}
+            ),
+        )
+        thread = yield from self.build_thread(user_prompt, draft=draft)
+
+        return thread, None
+
+    @staticmethod
+    def get_tokenomics_prompt(  # pylint: disable=unused-argument
+        chain_id: str,
+        contract_name: str,
+        event: Any,
+        event_template: str,
+        unit_metadata: Dict,
+    ) -> Optional[str]:
+        """Get the user prompt for a tokenomics event"""
+
         kwargs = {
             "n_epoch": event.args["epochCounter"],
             "eth_rewards": event.args["accountRewards"] / 1e18,
             "olas_topups": event.args["accountTopUps"] / 1e18,
         }
 
-        user_prompt = event_template.format(**kwargs)
-        thread = yield from self.build_thread(user_prompt)
-
-        return thread, None
+        return event_template.format(**kwargs)
 
     def build_treasury_tweet(  # pylint: disable=too-many-arguments,too-many-locals,unused-argument
         self,
@@ -780,6 +1387,7 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
         event_name: str,
         event: Any,
         event_template: str,
+        draft: Optional[Tuple[str, str, Dict]] = None,
     ) -> Generator[None, None, Tuple[Optional[List[str]], Optional[str]]]:
         """Build a thread for a treasury event"""
 
@@ -800,14 +1408,13 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
                 service_name = service_id_to_name[str(service_id)]
                 donations.append(f"☴ {amount / 1e18:.4f} ETH for {service_name}")
 
-        kwargs = {
-            "donator": event.args["sender"],
-            "amount": event.args["donation"] / 1e18,
-            "n_services": len(event.args["serviceIds"]),
-        }
-
-        user_prompt = event_template.format(**kwargs)
-        thread = yield from self.build_thread(user_prompt)
+        user_prompt = cast(
+            str,
+            self.get_treasury_prompt(
+                chain_id, contract_name, event, event_template, {}
+            ),
+        )
+        thread = yield from self.build_thread(user_prompt, draft=draft)
 
         if not thread:
             return None, None
@@ -816,6 +1423,24 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
 
         return thread, None
 
+    @staticmethod
+    def get_treasury_prompt(  # pylint: disable=unused-argument
+        chain_id: str,
+        contract_name: str,
+        event: Any,
+        event_template: str,
+        unit_metadata: Dict,
+    ) -> Optional[str]:
+        """Get the user prompt for a treasury event. The donations list is added to the thread afterwards."""
+
+        kwargs = {
+            "donator": event.args["sender"],
+            "amount": event.args["donation"] / 1e18,
+            "n_services": len(event.args["serviceIds"]),
+        }
+
+        return event_template.format(**kwargs)
+
     def build_veolas_tweet(  # pylint: disable=too-many-arguments,too-many-locals,unused-argument
         self,
         chain_id: str,
@@ -825,21 +1450,189 @@ class TsunamiBaseBehaviour(BaseBehaviour, ABC):  # pylint: disable=too-many-ance
         event_name: str,
         event: Any,
         event_template: str,
+        draft: Optional[Tuple[str, str, Dict]] = None,
     ) -> Generator[None, None, Tuple[Optional[List[str]], Optional[str]]]:
         """Build a thread for a veOLAS event"""
 
         self.context.logger.info(f"Processing veOLAS event {event}")
 
+        user_prompt = cast(
+            str,
+            self.get_veolas_prompt(chain_id, contract_name, event, event_template, {}),
+        )
+        thread = yield from self.build_thread(user_prompt, draft=draft)
+
+        return thread, None
+
+    @staticmethod
+    def get_veolas_prompt(  # pylint: disable=unused-argument
+        chain_id: str,
+        contract_name: str,
+        event: Any,
+        event_template: str,
+        unit_metadata: Dict,
+    ) -> Optional[str]:
+        """Get the user prompt for a veOLAS event"""
+
         kwargs = {
             "address": event.args["account"],
             "amount": event.args["amount"] / 1e18,
         }
 
-        user_prompt = event_template.format(**kwargs)
-        thread = yield from self.build_thread(user_prompt)
+        return event_template.format(**kwargs)
+
+    def get_event_digests(
+        self, chain_id: str, events: List, address_to_contract: Dict[str, str]
+    ) -> Dict[Tuple[str, str], List]:
+        """Group the events of every type that is past its digest threshold, by contract and event name"""
+
+        grouped_events: Dict[Tuple[str, str], List] = {}
+        for event in events:
+            contract_name = address_to_contract[event.address.lower()]
+            grouped_events.setdefault((contract_name, event.event), []).append(event)
+
+        digests = {}
+        for (contract_name, event_name), group in grouped_events.items():
+            contract_data = self.tracked_events[chain_id][contract_name]
+            threshold = self.params.event_digest_thresholds.get(event_name)
+            if (
+                threshold is None
+                or event_name not in contract_data["event_to_digest_template"]
+                or len(group) <= threshold
+            ):
+                continue
+
+            self.context.logger.info(
+                f"{len(group)} {contract_name}:{event_name} events on {chain_id} are past the digest threshold ({threshold}). Building a digest..."
+            )
+            digests[(contract_name, event_name)] = sorted(
+                group, key=lambda event: (event.block_number, event.log_index)
+            )
+
+        return digests
+
+    def build_registry_digest(  # pylint: disable=too-many-arguments,too-many-locals,unused-argument
+        self,
+        chain_id: str,
+        contract_id: str,
+        contract_name: str,
+        contract_address: str,
+        event_name: str,
+        events: List,
+        digest_template: str,
+        draft: Optional[Tuple[str, str, Dict]] = None,
+    ) -> Generator[None, None, Tuple[Optional[List[str]], Optional[str]]]:
+        """Build a single thread for many registry events"""
+
+        unit_type = "service" if contract_name == "service_registry" else "unit"
+        component_type = contract_name.split("_", maxsplit=1)[
+            0
+        ]  # service, agent or component
+
+        self.context.logger.info(
+            f"Processing {len(events)} registry events in a digest"
+        )
+
+        # Get the metadata of the newest units. It has been prefetched.
+        unit_metadata = {}
+        for event in events[-DIGEST_NEWEST_UNITS:]:
+            unit_id = event.args[f"{unit_type}Id"]
+            uri = yield from self.get_token_uri(
+                chain_id, contract_id, contract_address, unit_id
+            )
+            response_json = (
+                (yield from self.get_token_metadata(uri)) if uri is not None else None
+            )
+            if response_json:
+                unit_metadata[unit_id] = response_json
+
+        user_prompt = cast(
+            str,
+            self.get_registry_digest_prompt(
+                chain_id, contract_name, events, digest_template, unit_metadata
+            ),
+        )
+        thread = yield from self.build_thread(user_prompt, draft=draft)
+
+        return thread, f"{OLAS_REGISTRY_URL}/{chain_id}/{component_type}s"
+
+    @staticmethod
+    def get_registry_digest_prompt(
+        chain_id: str,
+        contract_name: str,
+        events: List,
+        digest_template: str,
+        unit_metadata: Dict,
+    ) -> Optional[str]:
+        """Get the user prompt for many registry events. The newest units are named if their metadata is there."""
+
+        unit_type = "service" if contract_name == "service_registry" else "unit"
+        newest = []
+        for event in reversed(events[-DIGEST_NEWEST_UNITS:]):
+            unit_id = event.args[f"{unit_type}Id"]
+            metadata = unit_metadata.get(unit_id)
+            newest.append(
+                f"{metadata['name']} (id {unit_id})" if metadata else f"id {unit_id}"
+            )
+
+        kwargs = {
+            "count": len(events),
+            "chain_name": chain_id,
+            "newest": ", ".join(newest),
+        }
+
+        return digest_template.format(**kwargs)
+
+    def build_veolas_digest(  # pylint: disable=too-many-arguments,too-many-locals,unused-argument
+        self,
+        chain_id: str,
+        contract_id: str,
+        contract_name: str,
+        contract_address: str,
+        event_name: str,
+        events: List,
+        digest_template: str,
+        draft: Optional[Tuple[str, str, Dict]] = None,
+    ) -> Generator[None, None, Tuple[Optional[List[str]], Optional[str]]]:
+        """Build a single thread for many veOLAS events"""
+
+        self.context.logger.info(f"Processing {len(events)} veOLAS events in a digest")
+
+        user_prompt = cast(
+            str,
+            self.get_veolas_digest_prompt(
+                chain_id, contract_name, events, digest_template, {}
+            ),
+        )
+        thread = yield from self.build_thread(user_prompt, draft=draft)
 
         return thread, None
 
+    @staticmethod
+    def get_veolas_digest_prompt(  # pylint: disable=unused-argument
+        chain_id: str,
+        contract_name: str,
+        events: List,
+        digest_template: str,
+        unit_metadata: Dict,
+    ) -> Optional[str]:
+        """Get the user prompt for many veOLAS events"""
+
+        amounts: Counter = Counter()
+        for event in events:
+            amounts[event.args["account"]] += event.args["amount"]
+        address, amount = amounts.most_common(1)[0]
+
+        kwargs = {
+            "count": len(events),
+            "n_addresses": len(amounts),
+            "total": sum(amounts.values()) / 1e18,
+            "address": address,
+            "amount": amount / 1e18,
+        }
+
+        return digest_template.format(**kwargs)
+
     def get_packages(self, package_type: str) -> Generator[None, None, Optional[Dict]]:
         """Gets minted packages from the subgraph"""
 
@@ -923,109 +1716,193 @@ class TrackChainEventsBehaviour(
                 tweets = json.loads(response["tweets"])
                 self.context.logger.info(f"Loaded tweets from db: {tweets}")
 
-        # Chain loop
-        for chain_id, contracts_data in self.tracked_events.items():
-            # Default from_block
-            from_block = getattr(self.params, f"initial_block_{chain_id}")
+        chain_ids = list(self.tracked_events.keys())
 
-            # Get from block
-            db_data = yield from self._read_kv(keys=(f"from_block_{chain_id}",))
+        # Get the from blocks for every chain
+        from_blocks = {
+            chain_id: getattr(self.params, f"initial_block_{chain_id}")
+            for chain_id in chain_ids
+        }
 
-            if db_data is None:
-                self.context.logger.error(
-                    "Error reading from the database. from_block won't be loaded."
-                )
-            else:
-                from_block = int(db_data.get(f"from_block_{chain_id}") or from_block)
+        db_data = yield from self._read_kv(
+            keys=tuple(f"from_block_{chain_id}" for chain_id in chain_ids)  # type: ignore
+        )
 
-            # Get to block
-            ledger_api_response = yield from self.get_ledger_api_response(
-                performative=LedgerApiMessage.Performative.GET_STATE,
-                ledger_callable="get_block_number",
-                chain_id=chain_id,
+        if db_data is None:
+            self.context.logger.error(
+                "Error reading from the database. from_block won't be loaded."
             )
-
-            if ledger_api_response.performative != LedgerApiMessage.Performative.STATE:
-                self.context.logger.error(
-                    f"Error while retieving latest block number: {ledger_api_response}\n. Skipping chain {chain_id}..."
+        else:
+            for chain_id in chain_ids:
+                from_blocks[chain_id] = int(
+                    db_data.get(f"from_block_{chain_id}") or from_blocks[chain_id]
                 )
-                continue
 
-            latest_block = cast(
-                int, ledger_api_response.state.body["get_block_number_result"]
-            )
+        # With the event stream, the chain_events connection keeps the index up to date
+        # and the contract only scans the blocks it missed, so the latest block is not needed
+        latest_blocks: Dict[str, Union[int, str]] = {}
+        if self.params.use_event_stream:
+            latest_blocks = {chain_id: "latest" for chain_id in chain_ids}
+        else:
+            latest_blocks = yield from self.get_latest_blocks(chain_ids)
 
+        for chain_id, latest_block in latest_blocks.items():
             self.context.logger.info(
-                f"chaind_id: {chain_id} from_block: {from_block} to_block: {latest_block}"
+                f"chaind_id: {chain_id} from_block: {from_blocks[chain_id]} to_block: {latest_block}"
             )
 
-            # Contract loop
-            for contract_name, contract_data in contracts_data.items():
-                contract_id = contract_data["contract_id"]
-                contract_address = contract_data["contract_address"]
+        # Get the events from all the tracked contracts on every chain at once
+        scanned_chain_ids = list(latest_blocks.keys())
+        pending_fetches: Dict[str, str] = {}
+        for chain_id in scanned_chain_ids:
+            pending_fetches[chain_id] = yield from self.dispatch(
+                self.request_chain_events(
+                    chain_id,
+                    {
+                        contract_data["contract_address"]: list(
+                            contract_data["event_to_template"].keys()
+                        )
+                        for contract_data in self.tracked_events[chain_id].values()
+                    },
+                    {
+                        event_name: event_fields
+                        for contract_data in self.tracked_events[chain_id].values()
+                        for event_name, event_fields in contract_data[
+                            "event_to_fields"
+                        ].items()
+                    },
+                    from_blocks[chain_id],
+                    latest_blocks[chain_id],
+                )
+            )
 
-                # Event type loop
-                for event_name, event_template in contract_data[
-                    "event_to_template"
-                ].items():
-                    self.context.logger.info(
-                        f"Getting {event_name} events from contract {contract_name} on {chain_id} [{contract_address}]"
-                    )
+        # Producer/consumer pipeline. Fetched events become work items that are enriched
+        # with their token metadata and pushed into a bounded queue, and threads are built
+        # from the queue. The chain fetches keep running while Llama is busy, so the
+        # threads of the first chain to answer are built while the others are still scanning.
+        pipeline_stats = cast(PipelineStats, self.context.pipeline_stats)
+        pipeline_stats.start(max(self.params.event_queue_size, 1))
+        fetch_deadline = datetime.now().timestamp() + self.params.round_timeout_seconds
+        backlogs: Dict[str, Deque[Dict]] = {}
+        queue: Deque[Tuple[str, Dict]] = deque()
+        chain_events: Dict[str, List] = {}
+        pending_items: Counter = Counter()
+
+        # Threads are built as the chains answer, but the tweets keep the tracked chain order
+        chain_tweets: Dict[str, List[Dict]] = {chain_id: [] for chain_id in chain_ids}
+        completed_chain_ids: Set[str] = set()
+
+        def get_ordered_tweets(completed_only: bool = False) -> List[Dict]:
+            """Get the previous tweets followed by the new ones, in chain order"""
+            return tweets + [
+                tweet
+                for chain_id in chain_ids
+                if not completed_only or chain_id in completed_chain_ids
+                for tweet in chain_tweets[chain_id]
+            ]
 
-                    # Get events
-                    events, _ = yield from self.get_events(
-                        contract_id,
-                        chain_id,
-                        contract_address,
-                        event_name,
-                        from_block,
-                        latest_block,
+        while pending_fetches or queue or any(backlogs.values()):
+            # Fetch stage: take the chains that have answered, without waiting for the rest
+            timed_out = datetime.now().timestamp() > fetch_deadline
+            for chain_id, request_nonce in list(pending_fetches.items()):
+                if request_nonce not in self._dispatched_responses and not timed_out:
+                    continue
+                del pending_fetches[chain_id]
+                if not pending_fetches:
+                    pipeline_stats.timings["fetch"] = pipeline_stats.elapsed
+
+                contract_api_msg = self._dispatched_responses.pop(request_nonce, None)
+                if contract_api_msg is None:
+                    self.abandon([request_nonce])
+                events, items = yield from self.get_chain_work_items(
+                    chain_id, from_blocks[chain_id], contract_api_msg
+                )
+                if events is None:
+                    continue
+                chain_events[chain_id] = events
+                backlogs[chain_id] = deque(items)
+                pending_items[chain_id] = len(items)
+
+                # Events without a thread to build, like the ones of untracked addresses
+                if not items and events:
+                    yield from self.mark_events_processed(chain_id, events)
+
+            # Enrich stage: refill the queue in batches, so the token uris and metadata
+            # of several events are still retrieved with a single request
+            room = pipeline_stats.queue_size - len(queue)
+            if not queue or room >= pipeline_stats.queue_size // 2:
+                for chain_id in scanned_chain_ids:
+                    backlog = backlogs.get(chain_id)
+                    if not backlog or room <= 0:
+                        continue
+                    batch = [backlog.popleft() for _ in range(min(room, len(backlog)))]
+                    start_time = pipeline_stats.elapsed
+                    yield from self.enrich_work_items(chain_id, batch)
+                    pipeline_stats.timings["enrich"] += (
+                        pipeline_stats.elapsed - start_time
                     )
-
-                    if events is None:
-                        self.context.logger.error(
-                            f"Error while retrieving events: {ledger_api_response}\n. Skipping event type {chain_id}:{contract_name}:{event_name}..."
+                    queue.extend((chain_id, item) for item in batch)
+                    pipeline_stats.counters["produced"] += len(batch)
+                    pipeline_stats.record_depth(len(queue))
+                    room -= len(batch)
+
+            # Nothing to build yet: wait for the next chain to answer
+            if not queue:
+                if pending_fetches:
+                    start_time = pipeline_stats.elapsed
+                    yield from self.wait_for_condition(
+                        lambda: any(
+                            nonce in self._dispatched_responses
+                            for nonce in pending_fetches.values()
                         )
-                        continue
+                        or datetime.now().timestamp() > fetch_deadline
+                    )
+                    pipeline_stats.timings["starved"] += (
+                        pipeline_stats.elapsed - start_time
+                    )
+                continue
 
-                    # Event loop
-                    for event in events:
-                        build_thread_function = contract_data["build_thread_function"]
-
-                        thread, link = yield from build_thread_function(
-                            chain_id,
-                            contract_id,
-                            contract_name,
-                            contract_address,
-                            event_name,
-                            event,
-                            event_template,
-                        )
+            # Generate stage: build the thread of the oldest work item. With llm_batch_size > 1,
+            # the first responses for it and the next items in the queue are drafted in one batch.
+            # The Llama connection runs batched requests one after the other, so it is 1 by default.
+            chain_id, item = queue.popleft()
+            pipeline_stats.record_depth(len(queue))
+            start_time = pipeline_stats.elapsed
+            if self.params.llm_batch_size > 1 and not item.get("drafted"):
+                batch = [(chain_id, item)] + list(queue)[
+                    : self.params.llm_batch_size - 1
+                ]
+                yield from self.draft_threads(batch)
+                for _, batch_item in batch:
+                    batch_item["drafted"] = True
+            thread = yield from self.build_work_item_thread(chain_id, item)
+            pipeline_stats.timings["generate"] += pipeline_stats.elapsed - start_time
+            pipeline_stats.counters["consumed"] += 1
+            pending_items[chain_id] -= 1
+
+            if thread is not None:
+                chain_tweets[chain_id].append(
+                    {
+                        "text": thread,
+                        "twitter_published": False,
+                        "farcaster_published": False,
+                        "telegram_published": False,
+                        "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    }
+                )
 
-                        if thread is None:
-                            self.context.logger.error(
-                                "Error while building thread. Skipping..."
-                            )
-                            continue
-
-                        # Add a link to the event
-                        if link:
-                            thread.append(link)
-
-                        tweets.append(
-                            {
-                                "text": thread,
-                                "twitter_published": False,
-                                "farcaster_published": False,
-                                "telegram_published": False,
-                                "timestamp": datetime.now().strftime(
-                                    "%Y-%m-%dT%H:%M:%SZ"
-                                ),
-                            }
-                        )
+            # Save the tweets before the events are marked as processed in the index,
+            # so the events are consumed again if the agent stops in between
+            if pending_items[chain_id] == 0:
+                completed_chain_ids.add(chain_id)
+                yield from self._write_kv(
+                    {"tweets": json.dumps(get_ordered_tweets(completed_only=True))}
+                )
+                yield from self.mark_events_processed(chain_id, chain_events[chain_id])
 
-            # Write from block
-            yield from self._write_kv({f"from_block_{chain_id}": str(latest_block)})
+        tweets = get_ordered_tweets()
+        pipeline_stats.finish()
+        self.context.logger.info(f"Event pipeline: {pipeline_stats.stats}")
 
         # Save tweets to the db
         yield from self._write_kv({"tweets": json.dumps(tweets)})
@@ -1034,48 +1911,264 @@ class TrackChainEventsBehaviour(
 
         return tweets
 
-    def get_events(  # pylint: disable=too-many-arguments
+    def get_chain_contract_address(self, chain_id: str) -> str:
+        """Get the address of any tracked contract on a chain, for the contract calls that work on the whole chain"""
+        return next(iter(self.tracked_events[chain_id].values()))["contract_address"]
+
+    def get_latest_blocks(
+        self, chain_ids: List[str]
+    ) -> Generator[None, None, Dict[str, Union[int, str]]]:
+        """Get the latest block for every chain at once, from the fastest healthy RPC of each chain"""
+        request_nonces = []
+        for chain_id in chain_ids:
+            request_nonce = yield from self.dispatch(
+                self.get_contract_api_response(
+                    performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
+                    contract_address=self.get_chain_contract_address(chain_id),
+                    contract_id=str(OlasEventsContract.contract_id),
+                    contract_callable="get_latest_block",
+                    chain_name=chain_id,
+                    chain_id=chain_id,
+                    rpc_urls=self.params.rpc_endpoints.get(chain_id),
+                    rpc_limits=self.get_rpc_limits(),
+                )
+            )
+            request_nonces.append(request_nonce)
+
+        contract_api_responses = yield from self.gather(
+            request_nonces, timeout=self.params.round_timeout_seconds
+        )
+
+        latest_blocks: Dict[str, Union[int, str]] = {}
+        for chain_id, contract_api_response in zip(chain_ids, contract_api_responses):
+            if (
+                contract_api_response is None
+                or contract_api_response.performative
+                != ContractApiMessage.Performative.STATE
+            ):
+                self.context.logger.error(
+                    f"Error while retieving latest block number: {contract_api_response}\n. Skipping chain {chain_id}..."
+                )
+                continue
+
+            latest_blocks[chain_id] = cast(
+                int, contract_api_response.state.body["latest_block"]
+            )
+
+        return latest_blocks
+
+    def request_chain_events(  # pylint: disable=too-many-arguments
         self,
-        contract_id: str,
         chain_id: str,
-        contract_address: str,
-        event_name: str,
+        contracts: Dict[str, List[str]],
+        fields: Dict[str, List[str]],
         from_block: int,
-        to_block: int,
-    ) -> Generator[None, None, Tuple[Optional[List], Optional[int]]]:
-        """Get registries events"""
+        to_block: Union[int, str],
+    ) -> Generator[None, None, Any]:
+        """Request the events from all the tracked contracts on a chain, with only the arguments in fields"""
 
         self.context.logger.info(
-            f"Retrieving {event_name} events later than block {from_block} on contract {chain_id}::{contract_id}::{contract_address}"
+            f"Retrieving events later than block {from_block} on chain {chain_id} for contracts {contracts}"
         )
 
         contract_api_msg = yield from self.get_contract_api_response(
             performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
-            contract_address=contract_address,
-            contract_id=contract_id,
+            contract_address=list(contracts.keys())[0],
+            contract_id=str(OlasEventsContract.contract_id),
             contract_callable="get_events",
-            event_name=event_name,
+            contracts=contracts,
             from_block=from_block,
             to_block=to_block,
             chain_name=chain_id,  # chain_id is intercepted so we need to duplicate this to reach the contract
             chain_id=chain_id,
+            index_path=self.params.event_index_path,
+            fields=fields,
+            stream_max_age=(
+                self.params.event_stream_max_age
+                if self.params.use_event_stream
+                else None
+            ),
+            rpc_urls=self.params.rpc_endpoints.get(chain_id),
+            rpc_limits=self.get_rpc_limits(),
         )
+        return contract_api_msg
 
-        if contract_api_msg.performative != ContractApiMessage.Performative.STATE:
+    def get_chain_work_items(
+        self,
+        chain_id: str,
+        from_block: int,
+        contract_api_msg: Optional[Message],
+    ) -> Generator[None, None, Tuple[Optional[List], List[Dict]]]:
+        """Get the events of a chain and split them into the work items of the thread builders"""
+
+        events, scanned_block = self.parse_chain_events(
+            chain_id, from_block, contract_api_msg
+        )
+
+        if events is None:
+            self.context.logger.error(
+                f"Error while retrieving events. Skipping chain {chain_id}..."
+            )
+            return None, []
+
+        # Write from block. The scan itself resumes from the per contract and event
+        # checkpoints in the index, so this is only the starting block for new ones.
+        yield from self._write_kv(
+            {f"from_block_{chain_id}": str(cast(int, scanned_block) + 1)}
+        )
+
+        # Map every tracked address to its contract so events can be routed back
+        address_to_contract = {
+            contract_data["contract_address"].lower(): contract_name
+            for contract_name, contract_data in self.tracked_events[chain_id].items()
+        }
+
+        # Events from addresses that are not tracked anymore are marked as processed without a thread
+        tracked = [e for e in events if e.address.lower() in address_to_contract]
+        for event in events:
+            if event.address.lower() not in address_to_contract:
+                self.context.logger.warning(
+                    f"Skipping {event.event} event from untracked address {event.address} on {chain_id}"
+                )
+
+        # Event types past their digest threshold get a single thread each,
+        # built at the position of their first event
+        digests = self.get_event_digests(chain_id, tracked, address_to_contract)
+        items = []
+        for event in tracked:
+            contract_name = address_to_contract[event.address.lower()]
+            key = (contract_name, event.event)
+            if key not in digests:
+                items.append(
+                    {
+                        "contract_name": contract_name,
+                        "event_name": event.event,
+                        "event": event,
+                    }
+                )
+            elif digests[key]:
+                items.append(
+                    {
+                        "contract_name": contract_name,
+                        "event_name": event.event,
+                        "events": digests[key],
+                    }
+                )
+                digests[key] = []
+
+        return events, items
+
+    def enrich_work_items(
+        self, chain_id: str, items: List[Dict]
+    ) -> Generator[None, None, None]:
+        """Resolve the token uris and download the metadata of a batch of work items at once"""
+        events = []
+        for item in items:
+            if "event" in item:
+                events.append(item["event"])
+            else:
+                events.extend(item["events"][-DIGEST_NEWEST_UNITS:])
+
+        yield from self.prefetch_token_uris(chain_id, events)
+        yield from self.prefetch_token_metadata(chain_id, events)
+
+    def build_work_item_thread(
+        self, chain_id: str, item: Dict
+    ) -> Generator[None, None, Optional[List[str]]]:
+        """Build the thread for an event or a digest of events"""
+        contract_name = item["contract_name"]
+        event_name = item["event_name"]
+        contract_data = self.tracked_events[chain_id][contract_name]
+        draft = self._thread_drafts.pop(get_work_item_id(chain_id, item), None)
+
+        if "events" in item:
+            thread, link = yield from contract_data["build_digest_function"](
+                chain_id,
+                contract_data["contract_id"],
+                contract_name,
+                contract_data["contract_address"],
+                event_name,
+                item["events"],
+                contract_data["event_to_digest_template"][event_name],
+                draft=draft,
+            )
+        else:
+            thread, link = yield from contract_data["build_thread_function"](
+                chain_id,
+                contract_data["contract_id"],
+                contract_name,
+                contract_data["contract_address"],
+                event_name,
+                item["event"],
+                contract_data["event_to_template"][event_name],
+                draft=draft,
+            )
+
+        if thread is None:
+            self.context.logger.error("Error while building thread. Skipping...")
+            return None
+
+        # Add a link to the event
+        if link:
+            thread.append(link)
+
+        return thread
+
+    def parse_chain_events(
+        self,
+        chain_id: str,
+        from_block: int,
+        contract_api_msg: Optional[Message],
+    ) -> Tuple[Optional[List], Optional[int]]:
+        """Parse the events from all the tracked contracts on a chain"""
+
+        if (
+            contract_api_msg is None
+            or contract_api_msg.performative != ContractApiMessage.Performative.STATE
+        ):
             self.context.logger.info(
                 f"Error retrieving the events [{contract_api_msg}]"
             )
             return None, None
 
-        events = cast(dict, contract_api_msg.state.body)["events"]
+        contract_api_msg = cast(ContractApiMessage, contract_api_msg)
+        events = unpack_events(cast(dict, contract_api_msg.state.body)["events"])
         latest_block = cast(dict, contract_api_msg.state.body)["latest_block"]
 
+        # The scan stopped early. The events until latest_block are still valid.
+        if "error" in contract_api_msg.state.body:
+            self.context.logger.error(contract_api_msg.state.body["error"])
+
         self.context.logger.info(
-            f"Got {len(events)} {event_name} events on {chain_id} from block {from_block} until block {latest_block}"
+            f"Got {len(events)} pending events on {chain_id}. Scanned from block {from_block} until block {latest_block}"
         )
 
         return events, latest_block
 
+    def mark_events_processed(
+        self, chain_id: str, events: List
+    ) -> Generator[None, None, None]:
+        """Mark events as processed in the event index so they are not consumed again"""
+
+        contract_api_msg = yield from self.get_contract_api_response(
+            performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
+            contract_address=self.get_chain_contract_address(chain_id),
+            contract_id=str(OlasEventsContract.contract_id),
+            contract_callable="mark_events_processed",
+            index_path=self.params.event_index_path,
+            event_keys=[
+                (event.block_number, event.transaction_hash, event.log_index)
+                for event in events
+            ],
+            chain_name=chain_id,
+            chain_id=chain_id,
+        )
+
+        if contract_api_msg.performative != ContractApiMessage.Performative.STATE:
+            self.context.logger.error(
+                f"Error marking the events as processed [{contract_api_msg}]"
+            )
+
 
 class TrackReposBehaviour(TsunamiBaseBehaviour):  # pylint: disable=too-many-ancestors
     """TrackReposBehaviour"""
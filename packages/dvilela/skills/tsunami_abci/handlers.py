@@ -342,6 +342,9 @@ class HttpHandler(BaseHttpHandler):
             "reset_pause_duration": self.context.params.reset_pause_duration,
             "rounds": rounds,
             "is_transitioning_fast": is_transitioning_fast,
+            "metadata_cache": self.context.metadata_cache.stats,
+            "ipfs_gateways": self.context.gateway_pool.stats,
+            "event_pipeline": self.context.pipeline_stats.stats,
         }
 
         self._send_ok_response(http_msg, http_dialogue, data)
@@ -20,7 +20,12 @@
 """This module contains the shared state for the abci skill of TsunamiAbciApp."""
 
 import json
-from typing import Any
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aea.skills.base import Model
 
 from packages.dvilela.skills.tsunami_abci.rounds import TsunamiAbciApp
 from packages.valory.skills.abstract_round_abci.models import ApiSpecs, BaseParams
@@ -42,6 +47,220 @@ class SharedState(BaseSharedState):
 Requests = BaseRequests
 BenchmarkTool = BaseBenchmarkTool
 
+IPFS_PATH_REGEX = r"(?:ipfs://|/ipfs/)([a-zA-Z0-9]+(?:/[^?#]*)?)"
+
+
+def get_metadata_cache_key(uri: str) -> Tuple[str, bool]:
+    """Get the cache key for a metadata uri and whether its content is immutable"""
+    match = re.search(IPFS_PATH_REGEX, uri)
+    # IPFS content is addressed by its hash, so it is the same on every gateway and never changes.
+    # A directory hash is shared by all the files below it, so the path is part of the key.
+    if match:
+        return f"ipfs:{match.group(1).rstrip('/')}", True
+    return f"uri:{uri}", False
+
+
+class MetadataCache(Model):
+    """An in-memory LRU cache for token metadata, in front of the persistent kv store."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Init"""
+        super().__init__(*args, **kwargs)
+        self.max_size = 0
+        self.ttl = 0
+        self.counters: Counter = Counter()
+        self._entries: OrderedDict[str, Tuple[Dict, float, bool]] = OrderedDict()
+
+    def setup(self) -> None:
+        """Set up."""
+        self.max_size = self.context.params.metadata_cache_size
+        self.ttl = self.context.params.metadata_cache_ttl
+
+    def is_fresh(self, timestamp: float, immutable: bool) -> bool:
+        """Check whether an entry is still valid"""
+        return immutable or time.time() - timestamp < self.ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Get an entry from memory"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        data, timestamp, immutable = entry
+        if not self.is_fresh(timestamp, immutable):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def put(
+        self,
+        key: str,
+        data: Dict,
+        immutable: bool,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """Add an entry to memory, evicting the least recently used ones"""
+        self._entries[key] = (data, timestamp or time.time(), immutable)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict:
+        """Get the cache counters"""
+        lookups = sum(self.counters.values())
+        return {
+            "size": len(self._entries),
+            "memory_hits": self.counters["memory_hits"],
+            "store_hits": self.counters["store_hits"],
+            "misses": self.counters["misses"],
+            "hit_rate": (
+                (lookups - self.counters["misses"]) / lookups if lookups else None
+            ),
+        }
+
+
+IPFS_PATH_REGEX = r"(?:ipfs://|/ipfs/)(.+)$"
+GATEWAY_LATENCY_SAMPLES = 100
+GATEWAY_MIN_SAMPLES = 5
+DEFAULT_HEDGE_DELAY_SECONDS = 1.0
+MIN_HEDGE_DELAY_SECONDS = 0.1
+GATEWAY_FAILURE_PENALTY_SECONDS = 10.0
+
+
+class GatewayPool(Model):
+    """A pool of IPFS gateways ranked by their observed latency."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Init"""
+        super().__init__(*args, **kwargs)
+        self.gateways: List[str] = []
+        self.hedge_percentile = 90
+        self.failures: Counter = Counter()
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def setup(self) -> None:
+        """Set up."""
+        self.gateways = [
+            gateway.rstrip("/") + "/" for gateway in self.context.params.ipfs_gateways
+        ]
+        self.hedge_percentile = self.context.params.gateway_hedge_percentile
+        self._latencies = {
+            gateway: deque(maxlen=GATEWAY_LATENCY_SAMPLES) for gateway in self.gateways
+        }
+
+    def percentile(self, gateway: str, percentile: int) -> Optional[float]:
+        """Get a latency percentile for a gateway, if there are enough samples"""
+        samples = sorted(self._latencies.get(gateway, []))
+        if len(samples) < GATEWAY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) * percentile // 100, len(samples) - 1)]
+
+    def get_urls(self, uri: str) -> List[Tuple[Optional[str], str]]:
+        """Get the gateways and urls to try for an uri, fastest gateways first"""
+        match = re.search(IPFS_PATH_REGEX, uri)
+        if not match or not self.gateways:
+            return [(None, uri)]
+
+        # Gateways without enough samples go first so they get measured
+        gateways = sorted(
+            self.gateways, key=lambda gateway: self.percentile(gateway, 50) or 0.0
+        )
+        return [(gateway, f"{gateway}{match.group(1)}") for gateway in gateways]
+
+    def hedge_delay(self, gateway: Optional[str]) -> float:
+        """Get how long to wait for a gateway before trying the next one"""
+        if gateway is None:
+            return DEFAULT_HEDGE_DELAY_SECONDS
+        delay = self.percentile(gateway, self.hedge_percentile)
+        if delay is None:
+            return DEFAULT_HEDGE_DELAY_SECONDS
+        return max(delay, MIN_HEDGE_DELAY_SECONDS)
+
+    def record(self, gateway: Optional[str], latency: float, success: bool) -> None:
+        """Record the latency of a request. Failures count as very slow responses."""
+        if gateway is None:
+            return
+        if not success:
+            self.failures[gateway] += 1
+            latency = max(latency, GATEWAY_FAILURE_PENALTY_SECONDS)
+        self._latencies.setdefault(
+            gateway, deque(maxlen=GATEWAY_LATENCY_SAMPLES)
+        ).append(latency)
+
+    @property
+    def stats(self) -> Dict:
+        """Get the latency stats of every gateway"""
+        return {
+            gateway: {
+                "samples": len(self._latencies.get(gateway, [])),
+                "p50": self.percentile(gateway, 50),
+                f"p{self.hedge_percentile}": self.percentile(
+                    gateway, self.hedge_percentile
+                ),
+                "failures": self.failures[gateway],
+            }
+            for gateway in self.gateways
+        }
+
+
+class PipelineStats(Model):
+    """Queue depth and stage timings of the event pipeline, for the last period that tracked events."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Init"""
+        super().__init__(*args, **kwargs)
+        self.queue_size = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.counters: Counter = Counter()
+        self.timings: Counter = Counter()
+        self._start_time: Optional[float] = None
+        self._end_time: Optional[float] = None
+
+    def start(self, queue_size: int) -> None:
+        """Reset the stats for a new run of the pipeline"""
+        self.queue_size = queue_size
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.counters = Counter()
+        self.timings = Counter()
+        self._start_time = time.monotonic()
+        self._end_time = None
+
+    def finish(self) -> None:
+        """Stop the clock once the queue has been drained"""
+        self.record_depth(0)
+        self._end_time = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """Get the time the pipeline has been running for"""
+        if self._start_time is None:
+            return 0.0
+        return (self._end_time or time.monotonic()) - self._start_time
+
+    def record_depth(self, queue_depth: int) -> None:
+        """Record the current queue depth"""
+        self.queue_depth = queue_depth
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    @property
+    def stats(self) -> Dict:
+        """Get the queue counters and the time spent in every stage"""
+        return {
+            "queue_size": self.queue_size,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "produced": self.counters["produced"],
+            "consumed": self.counters["consumed"],
+            "fetch_seconds": round(self.timings["fetch"], 3),
+            "enrich_seconds": round(self.timings["enrich"], 3),
+            "generate_seconds": round(self.timings["generate"], 3),
+            "starved_seconds": round(self.timings["starved"], 3),
+            "elapsed_seconds": round(self.elapsed, 3),
+        }
+
 
 class RandomnessApi(ApiSpecs):
     """A model that wraps ApiSpecs for randomness api specifications."""
@@ -96,5 +315,29 @@ class Params(BaseParams):  # pylint: disable=too-many-instance-attributes
         self.boardroom_api_key = self._ensure("boardroom_api_key", kwargs, str)
         self.subgraph_api_key = self._ensure("subgraph_api_key", kwargs, str)
         self.use_twikit = self._ensure("use_twikit", kwargs, bool)
+        self.event_index_path = self._ensure("event_index_path", kwargs, str)
+        self.metadata_cache_size = self._ensure("metadata_cache_size", kwargs, int)
+        self.metadata_cache_ttl = self._ensure("metadata_cache_ttl", kwargs, int)
+        self.metadata_download_concurrency = self._ensure(
+            "metadata_download_concurrency", kwargs, int
+        )
+        self.ipfs_gateways = self._ensure("ipfs_gateways", kwargs, List[str])
+        self.gateway_hedge_percentile = self._ensure(
+            "gateway_hedge_percentile", kwargs, int
+        )
+        self.use_event_stream = self._ensure("use_event_stream", kwargs, bool)
+        self.event_stream_max_age = self._ensure("event_stream_max_age", kwargs, int)
+        self.event_digest_thresholds = json.loads(
+            self._ensure("event_digest_thresholds", kwargs, str)
+        )
+        self.rpc_endpoints = json.loads(self._ensure("rpc_endpoints", kwargs, str))
+        self.rpc_requests_per_second = self._ensure(
+            "rpc_requests_per_second", kwargs, float
+        )
+        self.rpc_requests_per_period = self._ensure(
+            "rpc_requests_per_period", kwargs, int
+        )
+        self.event_queue_size = self._ensure("event_queue_size", kwargs, int)
+        self.llm_batch_size = self._ensure("llm_batch_size", kwargs, int)
 
         super().__init__(*args, **kwargs)
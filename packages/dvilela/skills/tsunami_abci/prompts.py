@@ -94,6 +94,20 @@ EVENT_USER_PROMPT_TEMPLATES = {
     "olas_unlocked": EVENT_USER_PROMPT_OLAS_UNLOCKED,
 }
 
+EVENT_DIGEST_USER_PROMPT_SERVICES_CREATED = "{count} new services have been minted on the Olas protocol on {chain_name}. The newest ones are: {newest}."
+EVENT_DIGEST_USER_PROMPT_AGENTS_CREATED = "{count} new agents have been minted on the Olas protocol on {chain_name}. The newest ones are: {newest}."
+EVENT_DIGEST_USER_PROMPT_COMPONENTS_CREATED = "{count} new components have been minted on the Olas protocol on {chain_name}. The newest ones are: {newest}."
+EVENT_DIGEST_USER_PROMPT_OLAS_LOCKED = "{n_addresses} addresses have locked a total of {total:.2f} OLAS in {count} deposits. The largest depositor is {address} with {amount:.2f} OLAS."
+EVENT_DIGEST_USER_PROMPT_OLAS_UNLOCKED = "{n_addresses} addresses have unlocked a total of {total:.2f} OLAS in {count} withdrawals. The largest one is {address} with {amount:.2f} OLAS."
+
+EVENT_DIGEST_USER_PROMPT_TEMPLATES = {
+    "service_minted": EVENT_DIGEST_USER_PROMPT_SERVICES_CREATED,
+    "agent_minted": EVENT_DIGEST_USER_PROMPT_AGENTS_CREATED,
+    "component_minted": EVENT_DIGEST_USER_PROMPT_COMPONENTS_CREATED,
+    "olas_locked": EVENT_DIGEST_USER_PROMPT_OLAS_LOCKED,
+    "olas_unlocked": EVENT_DIGEST_USER_PROMPT_OLAS_UNLOCKED,
+}
+
 REPO_USER_PROMPT_RELEASE = (
     "Version {version} of the {repo} repository has been released."
 )
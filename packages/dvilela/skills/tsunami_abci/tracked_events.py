@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+"""This module contains the chain events tracked by the skill."""
+
+from packages.dvilela.contracts.olas_registries.contract import OlasRegistriesContract
+from packages.dvilela.contracts.olas_tokenomics.contract import OlasTokenomicsContract
+from packages.dvilela.contracts.olas_treasury.contract import OlasTreasuryContract
+from packages.dvilela.contracts.veolas.contract import veOLASContract
+from packages.dvilela.skills.tsunami_abci.prompts import (
+    EVENT_DIGEST_USER_PROMPT_TEMPLATES,
+    EVENT_USER_PROMPT_TEMPLATES,
+)
+
+
+# The tracked contracts per chain: the param that holds their address, their events,
+# the event arguments to fetch, the behaviour method that builds their threads and the
+# one that builds their prompts from the data already fetched, without side effects.
+# Events with a digest template can be aggregated into a single thread when there are
+# too many of them (see the event_digest_thresholds param, which is empty by default).
+TRACKED_CONTRACTS = {
+    "ethereum": {
+        "service_registry": {
+            "contract_id": str(OlasRegistriesContract.contract_id),
+            "address_param": "service_registry_address_ethereum",
+            "event_to_template": {
+                "CreateService": EVENT_USER_PROMPT_TEMPLATES["service_minted"],
+            },
+            "event_to_fields": {"CreateService": ["serviceId"]},
+            "build_thread_function": "build_registry_tweet",
+            "build_prompt_function": "get_registry_prompt",
+            "event_to_digest_template": {
+                "CreateService": EVENT_DIGEST_USER_PROMPT_TEMPLATES["service_minted"],
+            },
+            "build_digest_function": "build_registry_digest",
+            "build_digest_prompt_function": "get_registry_digest_prompt",
+        },
+        "agent_registry": {
+            "contract_id": str(OlasRegistriesContract.contract_id),
+            "address_param": "agent_registry_address_ethereum",
+            "event_to_template": {
+                "CreateUnit": EVENT_USER_PROMPT_TEMPLATES["agent_minted"]
+            },
+            "event_to_fields": {"CreateUnit": ["unitId"]},
+            "build_thread_function": "build_registry_tweet",
+            "build_prompt_function": "get_registry_prompt",
+            "event_to_digest_template": {
+                "CreateUnit": EVENT_DIGEST_USER_PROMPT_TEMPLATES["agent_minted"],
+            },
+            "build_digest_function": "build_registry_digest",
+            "build_digest_prompt_function": "get_registry_digest_prompt",
+        },
+        "component_registry": {
+            "contract_id": str(OlasRegistriesContract.contract_id),
+            "address_param": "component_registry_address_ethereum",
+            "event_to_template": {
+                "CreateUnit": EVENT_USER_PROMPT_TEMPLATES["component_minted"]
+            },
+            "event_to_fields": {"CreateUnit": ["unitId"]},
+            "build_thread_function": "build_registry_tweet",
+            "build_prompt_function": "get_registry_prompt",
+            "event_to_digest_template": {
+                "CreateUnit": EVENT_DIGEST_USER_PROMPT_TEMPLATES["component_minted"],
+            },
+            "build_digest_function": "build_registry_digest",
+            "build_digest_prompt_function": "get_registry_digest_prompt",
+        },
+        "tokenomics": {
+            "contract_id": str(OlasTokenomicsContract.contract_id),
+            "address_param": "tokenomics_address_ethereum",
+            "event_to_template": {
+                "EpochSettled": EVENT_USER_PROMPT_TEMPLATES["epoch_settled"]
+            },
+            "event_to_fields": {
+                "EpochSettled": [
+                    "epochCounter",
+                    "accountRewards",
+                    "accountTopUps",
+                ]
+            },
+            "build_thread_function": "build_tokenomics_tweet",
+            "build_prompt_function": "get_tokenomics_prompt",
+        },
+        "treasury": {
+            "contract_id": str(OlasTreasuryContract.contract_id),
+            "address_param": "treasury_address_ethereum",
+            "event_to_template": {
+                "DonateToServicesETH": EVENT_USER_PROMPT_TEMPLATES["donation_sent"]
+            },
+            "event_to_fields": {
+                "DonateToServicesETH": [
+                    "sender",
+                    "serviceIds",
+                    "amounts",
+                    "donation",
+                ]
+            },
+            "build_thread_function": "build_treasury_tweet",
+            "build_prompt_function": "get_treasury_prompt",
+        },
+        "veolas": {
+            "contract_id": str(veOLASContract.contract_id),
+            "address_param": "veolas_address_ethereum",
+            "event_to_template": {
+                "Deposit": EVENT_USER_PROMPT_TEMPLATES["olas_locked"],
+                "Withdraw": EVENT_USER_PROMPT_TEMPLATES["olas_unlocked"],
+            },
+            "event_to_fields": {
+                "Deposit": ["account", "amount"],
+                "Withdraw": ["account", "amount"],
+            },
+            "build_thread_function": "build_veolas_tweet",
+            "build_prompt_function": "get_veolas_prompt",
+            "event_to_digest_template": {
+                "Deposit": EVENT_DIGEST_USER_PROMPT_TEMPLATES["olas_locked"],
+                "Withdraw": EVENT_DIGEST_USER_PROMPT_TEMPLATES["olas_unlocked"],
+            },
+            "build_digest_function": "build_veolas_digest",
+            "build_digest_prompt_function": "get_veolas_digest_prompt",
+        },
+    },
+    "gnosis": {
+        "service_registry": {
+            "contract_id": str(OlasRegistriesContract.contract_id),
+            "address_param": "service_registry_address_gnosis",
+            "event_to_template": {
+                "CreateService": EVENT_USER_PROMPT_TEMPLATES["service_minted"],
+            },
+            "event_to_fields": {"CreateService": ["serviceId"]},
+            "build_thread_function": "build_registry_tweet",
+            "build_prompt_function": "get_registry_prompt",
+            "event_to_digest_template": {
+                "CreateService": EVENT_DIGEST_USER_PROMPT_TEMPLATES["service_minted"],
+            },
+            "build_digest_function": "build_registry_digest",
+            "build_digest_prompt_function": "get_registry_digest_prompt",
+        },
+    },
+}
@@ -19,7 +19,16 @@
 
 """This module contains the shared state for the abci skill of TsunamiChainedSkillAbciApp."""
 
+from packages.dvilela.skills.tsunami_abci.models import (
+    GatewayPool as TsunamiGatewayPool,
+)
+from packages.dvilela.skills.tsunami_abci.models import (
+    MetadataCache as TsunamiMetadataCache,
+)
 from packages.dvilela.skills.tsunami_abci.models import Params as TsunamiParams
+from packages.dvilela.skills.tsunami_abci.models import (
+    PipelineStats as TsunamiPipelineStats,
+)
 from packages.dvilela.skills.tsunami_abci.models import (
     RandomnessApi as TsunamiRandomnessApi,
 )
@@ -41,6 +50,9 @@ from packages.valory.skills.termination_abci.models import TerminationParams
 Requests = BaseRequests
 BenchmarkTool = BaseBenchmarkTool
 RandomnessApi = TsunamiRandomnessApi
+MetadataCache = TsunamiMetadataCache
+GatewayPool = TsunamiGatewayPool
+PipelineStats = TsunamiPipelineStats
 
 MARGIN = 5
 MULTIPLIER = 100
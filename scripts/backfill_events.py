@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""
+Script to backfill the event index with the historical events of the tracked contracts.
+
+It runs outside the agent, with the same contracts, events, index and checkpoints,
+so a new deployment starts scanning near the chain head. The backfilled events are
+marked as processed so the agent does not tweet about them.
+
+The configuration is read from the same environment variables as the service
+(ETHEREUM_LEDGER_RPC, INITIAL_BLOCK_ETHEREUM, EVENT_INDEX_PATH...), falling back
+to the skill defaults.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+import yaml
+from aea_ledger_ethereum import EthereumApi
+from web3 import Web3
+
+from packages.dvilela.contracts.olas_events.contract import (
+    EVENT_ABIS,
+    OlasEventsContract,
+)
+from packages.dvilela.contracts.olas_events.index import (
+    commit_window,
+    get_checkpoints,
+    init_index,
+)
+from packages.dvilela.contracts.olas_events.scanner import (
+    get_event_scanner,
+    scan_events,
+)
+from packages.dvilela.skills.tsunami_abci.tracked_events import TRACKED_CONTRACTS
+
+
+SKILL_CONFIG_PATH = Path(
+    Path(__file__).parent.parent,
+    "packages",
+    "dvilela",
+    "skills",
+    "tsunami_abci",
+    "skill.yaml",
+)
+RPC_ENV_VARS = {"ethereum": "ETHEREUM_LEDGER_RPC", "gnosis": "GNOSIS_LEDGER_RPC"}
+DEFAULT_WORKERS = 16
+MAX_ATTEMPTS = 5
+
+
+def load_params() -> Dict[str, Any]:
+    """Load the skill params, overridden by their service environment variables"""
+    with open(SKILL_CONFIG_PATH, "r", encoding="utf-8") as config_file:
+        params = yaml.safe_load(config_file)["models"]["params"]["args"]
+    return {name: os.environ.get(name.upper(), value) for name, value in params.items()}
+
+
+def get_contracts(params: Dict[str, Any], chain_name: str) -> Dict[str, List[str]]:
+    """Get the tracked events of a chain, by contract address"""
+    contracts: Dict[str, List[str]] = {}
+    for contract_data in TRACKED_CONTRACTS[chain_name].values():
+        address = Web3.to_checksum_address(params[contract_data["address_param"]])
+        contracts.setdefault(address, []).extend(contract_data["event_to_template"])
+    return contracts
+
+
+def backfill(  # pylint: disable=too-many-arguments,too-many-locals
+    chain_name: str,
+    rpc: str,
+    contracts: Dict[str, List[str]],
+    from_block: int,
+    to_block: Optional[int],
+    workers: int,
+    processed: bool,
+) -> Tuple[int, int]:
+    """Scan a chain from its checkpoints, or from_block, up to to_block and index its events"""
+    ledger_api = EthereumApi(address=rpc)
+    tracked_events = [
+        (address, event_name)
+        for address, event_names in contracts.items()
+        for event_name in event_names
+    ]
+    scanners = [
+        (
+            get_event_scanner(
+                str(OlasEventsContract.contract_id),
+                chain_name,
+                address,
+                EVENT_ABIS[chain_name],
+            ),
+            event_names,
+        )
+        for address, event_names in contracts.items()
+    ]
+
+    checkpoints = get_checkpoints(chain_name, tracked_events)
+    first_block = min(
+        checkpoints.get(tracked_event, from_block - 1) + 1
+        for tracked_event in tracked_events
+    )
+    last_block = (
+        ledger_api.api.eth.get_block_number() - 1 if to_block is None else to_block
+    )
+    n_blocks = max(last_block - first_block + 1, 1)
+    n_events = 0
+    start_time = time.monotonic()
+
+    def on_events(  # pylint: disable=unused-argument
+        start: int, end: int, events: List
+    ) -> None:
+        """Index the events of a window and report the progress"""
+        nonlocal n_events
+        commit_window(chain_name, events, tracked_events, end, processed)
+        n_events += len(events)
+        elapsed = time.monotonic() - start_time
+        speed = (end - first_block + 1) / elapsed
+        click.echo(
+            f"[{chain_name}] block {end}/{last_block} "
+            f"({100 * (end - first_block + 1) / n_blocks:.1f}%) "
+            f"events={n_events} speed={speed:.0f} blocks/s "
+            f"eta={(last_block - end) / speed:.0f}s"
+        )
+
+    click.echo(
+        f"[{chain_name}] Backfilling blocks {first_block}-{last_block} with {workers} workers"
+    )
+
+    # Failed windows are retried from the checkpoints
+    next_block = first_block
+    for _ in range(MAX_ATTEMPTS):
+        if next_block > last_block:
+            break
+        result = scan_events(
+            ledger_api,
+            chain_name,
+            scanners,
+            next_block,
+            last_block,
+            time_budget=float("inf"),
+            on_events=on_events,
+            max_workers=workers,
+        )
+        next_block = result["latest_block"] + 1
+        if "error" in result:
+            click.echo(f"[{chain_name}] {result['error']}. Resuming...")
+
+    if next_block <= last_block:
+        raise click.ClickException(
+            f"[{chain_name}] Could not backfill past block {next_block - 1}. Run again to resume."
+        )
+
+    return next_block - 1, n_events
+
+
+@click.command()
+@click.option(
+    "--chain",
+    "chain_names",
+    multiple=True,
+    type=click.Choice(list(TRACKED_CONTRACTS)),
+    help="Chains to backfill. All of them by default.",
+)
+@click.option(
+    "--to-block",
+    type=int,
+    default=None,
+    help="Last block to backfill. The latest block by default.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=DEFAULT_WORKERS,
+    show_default=True,
+    help="Block windows fetched at the same time per chain.",
+)
+@click.option(
+    "--pending",
+    is_flag=True,
+    help="Leave the backfilled events pending, so the agent tweets about them.",
+)
+def main(
+    chain_names: Tuple[str, ...],
+    to_block: Optional[int],
+    workers: int,
+    pending: bool,
+) -> None:
+    """Backfill the event index with the historical events of the tracked contracts."""
+    params = load_params()
+    chain_names = chain_names or tuple(TRACKED_CONTRACTS)
+    init_index(params["event_index_path"])
+    click.echo(f"Event index: {params['event_index_path']}")
+
+    with ThreadPoolExecutor(max_workers=len(chain_names)) as executor:
+        futures = {
+            chain_name: executor.submit(
+                backfill,
+                chain_name,
+                os.environ[RPC_ENV_VARS[chain_name]],
+                get_contracts(params, chain_name),
+                int(params[f"initial_block_{chain_name}"]),
+                to_block,
+                workers,
+                not pending,
+            )
+            for chain_name in chain_names
+        }
+        for chain_name, future in futures.items():
+            last_block, n_events = future.result()
+            click.echo(
+                f"[{chain_name}] Done. Indexed {n_events} events until block {last_block}"
+            )
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Script to benchmark the contract event scanners against a local mock JSON-RPC server"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from aea_ledger_ethereum import EthereumApi
+from mock_rpc import MockRpcServer, VEOLAS_ADDRESS, build_log_source
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+from packages.dvilela.contracts.olas_events import scanner
+from packages.dvilela.contracts.olas_registries.contract import (
+    EVENT_ABIS as REGISTRIES_EVENT_ABIS,
+)
+from packages.dvilela.contracts.olas_registries.contract import OlasRegistriesContract
+from packages.dvilela.contracts.olas_tokenomics.contract import OlasTokenomicsContract
+from packages.dvilela.contracts.olas_treasury.contract import OlasTreasuryContract
+from packages.dvilela.contracts.veolas.contract import veOLASContract
+
+
+FROM_BLOCK = 18_500_000
+TO_BLOCK = 19_000_000
+LEGACY_MAX_BLOCKS = 5000
+LEGACY_MAX_ATTEMPTS = 100  # the original loop retried forever
+CONTRACTS_PATH = Path(Path(__file__).parent.parent, "packages", "dvilela", "contracts")
+MICRO_CALLS = 50
+MICRO_BLOCKS = 1000
+WIRE_BLOCKS = 20000
+WIRE_CALLS = 20
+
+# contract name, contract class, address, event name, build file
+MICRO_CONTRACTS: List[Any] = [
+    (
+        "registries",
+        OlasRegistriesContract,
+        "0x48b6af7B12C71f09e2fC8aF4855De4Ff54e775cA",
+        "CreateService",
+        None,
+    ),
+    (
+        "tokenomics",
+        OlasTokenomicsContract,
+        "0xc096362fa6f4A4B1a9ea68b1043416f3381ce300",
+        "EpochSettled",
+        "olas_tokenomics/build/OlasTokenomics.json",
+    ),
+    (
+        "treasury",
+        OlasTreasuryContract,
+        "0xa0DA53447C0f6C4987964d8463da7e6628B30f82",
+        "DonateToServicesETH",
+        "olas_treasury/build/OlasTreasury.json",
+    ),
+    ("veolas", veOLASContract, VEOLAS_ADDRESS, "Deposit", "veolas/build/veOLAS.json"),
+]
+
+
+def legacy_scan(ledger_api: EthereumApi) -> int:
+    """The original filter-based scanner: create_filter + get_all_entries per window"""
+    event = veOLASContract.get_instance(ledger_api, VEOLAS_ADDRESS).events.Deposit
+    n_events = 0
+    for window_start in range(FROM_BLOCK, TO_BLOCK + 1, LEGACY_MAX_BLOCKS):
+        window_end = min(window_start + LEGACY_MAX_BLOCKS - 1, TO_BLOCK)
+        for _ in range(LEGACY_MAX_ATTEMPTS):
+            try:
+                n_events += len(
+                    event.create_filter(
+                        fromBlock=window_start, toBlock=window_end
+                    ).get_all_entries()
+                )
+                break
+            except ValueError:
+                pass
+    return n_events
+
+
+def stateless_scan(ledger_api: EthereumApi) -> int:
+    """The stateless eth_getLogs scanner"""
+    result = veOLASContract.get_events(
+        ledger_api, VEOLAS_ADDRESS, "Deposit", FROM_BLOCK, TO_BLOCK
+    )
+    return len(scanner.unpack_events(result["events"]))
+
+
+def run(name: str, scan, filter_loss_rate: float) -> None:  # type: ignore
+    """Run a scanner against a fresh mock server and report its cost"""
+    server = MockRpcServer(
+        latest_block=TO_BLOCK, latency=0.005, filter_loss_rate=filter_loss_rate
+    ).start()
+    ledger_api = EthereumApi(address=server.url, chain_id=1)
+    server.calls.clear()
+    start_time = time.monotonic()
+    n_events = scan(ledger_api)
+    elapsed = time.monotonic() - start_time
+    server.stop()
+    print(
+        f"{name:<10} filter_loss_rate={filter_loss_rate:<4} events={n_events:<4} "
+        f"round_trips={sum(server.calls.values()):<6} time={elapsed:.2f}s {dict(server.calls)}"
+    )
+
+
+def get_event_abi(contract: Any, event_name: str, build: str) -> Dict:
+    """Get an event abi from a contract build, or from the registries event abis"""
+    abi = (
+        REGISTRIES_EVENT_ABIS["ethereum"]
+        if build is None
+        else contract.contract_interface["ethereum"]["abi"]
+    )
+    return next(
+        entry
+        for entry in abi
+        if entry["type"] == "event" and entry["name"] == event_name
+    )
+
+
+def micro_benchmark() -> None:
+    """Measure the per-call cost of the shared scanning engine for every contract"""
+    server = MockRpcServer(
+        latest_block=TO_BLOCK,
+        event_every=100,
+        log_sources=[
+            build_log_source(address, get_event_abi(contract, event_name, build))
+            for _, contract, address, event_name, build in MICRO_CONTRACTS
+        ],
+    ).start()
+    ledger_api = EthereumApi(address=server.url, chain_id=1)
+
+    for name, contract, address, event_name, _ in MICRO_CONTRACTS:
+        for cached in (False, True):
+            start_time = time.monotonic()
+            for _ in range(MICRO_CALLS):
+                # Without the cache, every call rebuilds the contract instance and topics
+                if not cached:
+                    scanner._scanners.clear()  # pylint: disable=protected-access
+                result = contract.get_events(
+                    ledger_api,
+                    address,
+                    event_name,
+                    FROM_BLOCK,
+                    FROM_BLOCK + MICRO_BLOCKS - 1,
+                )
+            elapsed = time.monotonic() - start_time
+            print(
+                f"{name:<10} cached={str(cached):<5} events={len(scanner.unpack_events(result['events'])):<4} "
+                f"time_per_call={1000 * elapsed / MICRO_CALLS:.2f}ms"
+            )
+
+    server.stop()
+
+
+def wire_benchmark() -> None:  # pylint: disable=too-many-locals
+    """Compare the size and serialization time of the full web3 events and the packed ones"""
+    for name, contract, address, event_name, build in MICRO_CONTRACTS[1:]:
+        event_abi = get_event_abi(contract, event_name, build)
+        server = MockRpcServer(
+            latest_block=TO_BLOCK,
+            event_every=10,
+            log_sources=[build_log_source(address, event_abi)],
+        ).start()
+        ledger_api = EthereumApi(address=server.url, chain_id=1)
+        to_block = FROM_BLOCK + WIRE_BLOCKS - 1
+
+        # The events as the contracts used to return them
+        logs = ledger_api.api.eth.get_logs(
+            {"address": address, "fromBlock": FROM_BLOCK, "toBlock": to_block}
+        )
+        web3_events = [
+            get_event_data(ledger_api.api.codec, event_abi, log) for log in logs
+        ]
+        start_time = time.monotonic()
+        for _ in range(WIRE_CALLS):
+            web3_payload = Web3.to_json(web3_events)  # type: ignore
+        web3_time = (time.monotonic() - start_time) / WIRE_CALLS
+
+        # The packed events, with the same projection the skill uses
+        fields = [i["name"] for i in event_abi["inputs"]][:2]
+        events = contract.get_events(
+            ledger_api, address, event_name, FROM_BLOCK, to_block
+        )["events"]
+        records = scanner.unpack_events(events)
+        start_time = time.monotonic()
+        for _ in range(WIRE_CALLS):
+            packed = scanner.pack_events(records, {event_name: fields})
+            packed_payload = json.dumps(packed)
+        packed_time = (time.monotonic() - start_time) / WIRE_CALLS
+
+        server.stop()
+        print(
+            f"{name:<10} events={len(records):<5} "
+            f"web3={len(web3_payload) / 1024:.1f}KiB/{1000 * web3_time:.2f}ms "
+            f"packed={len(packed_payload) / 1024:.1f}KiB/{1000 * packed_time:.2f}ms"
+        )
+
+
+for contract_class, build_file in (
+    (OlasTokenomicsContract, "olas_tokenomics/build/OlasTokenomics.json"),
+    (OlasTreasuryContract, "olas_treasury/build/OlasTreasury.json"),
+    (veOLASContract, "veolas/build/veOLAS.json"),
+):
+    contract_class.contract_interface = {
+        "ethereum": json.loads(
+            Path(CONTRACTS_PATH, build_file).read_text(encoding="utf-8")
+        )
+    }
+
+for loss_rate in (0.0, 0.3):
+    run("legacy", legacy_scan, loss_rate)
+    run("stateless", stateless_scan, loss_rate)
+
+micro_benchmark()
+wire_benchmark()
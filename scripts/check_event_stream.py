@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Script to check the chain events stream against local mock JSON-RPC servers"""
+
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from aea_ledger_ethereum import EthereumApi
+from mock_rpc import MockRpcServer, MockWsRpcServer, VEOLAS_ADDRESS, build_log_source
+
+from packages.dvilela.connections.chain_events.connection import ChainEventStream
+from packages.dvilela.contracts.olas_events.contract import (
+    EVENT_ABIS,
+    OlasEventsContract,
+)
+from packages.dvilela.contracts.olas_events.index import get_stream_head, query_events
+from packages.dvilela.contracts.olas_events.scanner import unpack_events
+
+
+FROM_BLOCK = 1000
+EVENT_EVERY = 3
+BLOCK_TIME = 0.2
+STREAM_MAX_AGE = 5
+CONTRACTS = {VEOLAS_ADDRESS: ["Deposit"]}
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("check_event_stream")
+
+
+def wait_for_head(block: int, timeout: float = 10.0) -> float:
+    """Wait until the stream has indexed a block and get the seconds since it was mined"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stream_head = get_stream_head("ethereum", STREAM_MAX_AGE)
+        if stream_head is not None and stream_head >= block:
+            return time.monotonic() - ws.mined_at[block]
+        time.sleep(0.01)
+    raise TimeoutError(f"Block {block} was not indexed")
+
+
+def get_events(api: EthereumApi, events_path: str) -> dict:
+    """Get the pending events like the skill does in streaming mode"""
+    return OlasEventsContract.get_events(
+        api,
+        VEOLAS_ADDRESS,
+        CONTRACTS,
+        FROM_BLOCK,
+        "latest",
+        index_path=events_path,
+        stream_max_age=STREAM_MAX_AGE,
+    )
+
+
+deposit_abi = next(e for e in EVENT_ABIS["ethereum"] if e["name"] == "Deposit")
+rpc = MockRpcServer(
+    latest_block=FROM_BLOCK + 100,
+    event_every=EVENT_EVERY,
+    log_sources=[build_log_source(VEOLAS_ADDRESS, deposit_abi)],
+).start()
+ws = MockWsRpcServer(rpc, block_time=BLOCK_TIME).start()
+ledger_api = EthereumApi(address=rpc.url, chain_id=1)
+index_path = str(Path(tempfile.mkdtemp(), "events.db"))
+
+# The first period range scans from the initial block and creates the checkpoints
+get_events(ledger_api, index_path)
+
+# The stream subscribes to the events the skill recorded in the index
+stream = ChainEventStream("ethereum", ws.url, rpc.url, logger)
+running = True
+threading.Thread(
+    target=asyncio.new_event_loop().run_until_complete,
+    args=(stream.run(lambda: running),),
+    daemon=True,
+).start()
+
+# Detection latency: from the block being mined to its events being in the index
+time.sleep(1)
+latencies = [wait_for_head(rpc.latest_block + 1) for _ in range(10)]
+logger.info(
+    f"Detection latency: avg={sum(latencies) / len(latencies):.2f}s max={max(latencies):.2f}s"
+)
+
+# While the stream is live, the skill does not query the RPC
+calls = sum(rpc.calls.values())
+result = get_events(ledger_api, index_path)
+logger.info(
+    f"Streaming mode: {len(result['events']['rows'])} pending events, "
+    f"{sum(rpc.calls.values()) - calls} RPC calls"
+)
+
+# Disconnect. The blocks mined meanwhile are range scanned after reconnecting.
+ws.drop_connections()
+dropped_at = rpc.latest_block
+time.sleep(2)
+logger.info(
+    f"Dropped the subscription at block {dropped_at}, {rpc.latest_block - dropped_at} blocks mined since"
+)
+wait_for_head(rpc.latest_block + 1, timeout=30)
+
+running = False
+ws.stop()
+head = get_stream_head("ethereum", STREAM_MAX_AGE)
+expected = {
+    int(log["blockNumber"], 16)
+    for log in rpc.get_logs(
+        {"address": VEOLAS_ADDRESS, "fromBlock": hex(FROM_BLOCK), "toBlock": hex(head)}
+    )
+}
+indexed = {e.block_number for e in query_events("ethereum", to_block=head)}
+logger.info(
+    f"Indexed {len(indexed)}/{len(expected)} events until block {head}. "
+    f"Missing: {sorted(expected - indexed)}"
+)
+assert indexed == expected
+assert len(unpack_events(result["events"])) == len(result["events"]["rows"])
+rpc.stop()
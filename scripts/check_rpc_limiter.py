@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Script to check the RPC rate limiter and the per-period request budget against a throttling mock JSON-RPC server"""
+
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from aea_ledger_ethereum import EthereumApi
+from mock_rpc import MockRpcServer, VEOLAS_ADDRESS
+
+from packages.dvilela.contracts.olas_events.contract import OlasEventsContract
+from packages.dvilela.contracts.olas_events.index import query_events
+from packages.dvilela.contracts.olas_events.rpc_pool import (
+    BURST_SECONDS,
+    RequestLimiter,
+    reset_rpc_pools,
+)
+from packages.dvilela.contracts.olas_events.scanner import unpack_events
+
+
+LATEST_BLOCK = 3_000_000
+FROM_BLOCK = 1_000_000
+EVENT_EVERY = 5000
+MAX_REQUESTS_PER_SECOND = 20
+MAX_BLOCK_RANGE = 20_000
+CONTRACTS = {VEOLAS_ADDRESS: ["Deposit"]}
+
+logging.basicConfig(level=logging.ERROR, format="%(message)s")
+logger = logging.getLogger("check_rpc_limiter")
+logger.setLevel(logging.INFO)
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps"""
+
+    def __init__(self) -> None:
+        """Init"""
+        self.time = 0.0
+
+    def now(self) -> float:
+        """Get the current time"""
+        return self.time
+
+    def sleep(self, seconds: float) -> None:
+        """Move the clock forward"""
+        self.time += seconds
+
+
+def get_events(
+    server: MockRpcServer, rpc_limits: Dict, events_path: Optional[str] = None
+) -> Dict:
+    """Get the events like the skill does"""
+    return OlasEventsContract.get_events(
+        EthereumApi(address=server.url, chain_id=1),
+        VEOLAS_ADDRESS,
+        CONTRACTS,
+        FROM_BLOCK,
+        LATEST_BLOCK,
+        index_path=events_path,
+        rpc_limits=rpc_limits,
+    )
+
+
+def run(requests_per_second: Optional[float]) -> Dict:
+    """Scan the whole range against an RPC that throttles above MAX_REQUESTS_PER_SECOND"""
+    # Every run starts with a fresh limiter. The mock RPC throttles on the wall clock.
+    reset_rpc_pools()
+    server = MockRpcServer(
+        latest_block=LATEST_BLOCK,
+        event_every=EVENT_EVERY,
+        latency=0.05,
+        max_requests_per_second=MAX_REQUESTS_PER_SECOND,
+        max_block_range=MAX_BLOCK_RANGE,
+    ).start()
+    start_time = time.monotonic()
+    scan = get_events(server, dict(requests_per_second=requests_per_second, period=0))
+    server.stop()
+    return dict(
+        elapsed=round(time.monotonic() - start_time, 2),
+        events=len(unpack_events(scan["events"])),
+        latest_block=scan["latest_block"],
+        requests=sum(server.calls.values()),
+        throttled=server.throttled,
+        error=scan.get("error"),
+    )
+
+
+expected = (LATEST_BLOCK - FROM_BLOCK) // EVENT_EVERY + 1
+
+# The token bucket lets a burst through and then paces the requests at the rate.
+# A power of two rate keeps the fake clock arithmetic exact.
+clock = FakeClock()
+limiter = RequestLimiter("ethereum", now=clock.now, sleep=clock.sleep)
+limiter.configure(requests_per_second=8)
+for _ in range(18):
+    limiter.acquire()
+burst = 8 * BURST_SECONDS
+logger.info(f"18 requests at 8 req/s with a burst of {burst} took {clock.time:.2f}s")
+assert clock.time == (18 - burst) / 8, clock.time
+limiter.record_throttled()
+assert limiter.rate == 4, limiter.rate
+
+# Bursts get throttled, the limiter keeps the request rate under the RPC limit
+unlimited = run(requests_per_second=None)
+logger.info(f"Without limiter: {unlimited}")
+limited = run(requests_per_second=MAX_REQUESTS_PER_SECOND * 0.8)
+logger.info(f"With limiter: {limited}")
+assert limited["events"] == expected and limited["error"] is None, limited
+assert limited["throttled"] == 0, limited
+
+# A small budget stops the scan at a checkpoint, and the next periods resume from it.
+# How many periods it takes depends on how the concurrent windows grow.
+reset_rpc_pools()
+rpc = MockRpcServer(
+    latest_block=LATEST_BLOCK, event_every=EVENT_EVERY, max_block_range=MAX_BLOCK_RANGE
+).start()
+index_path = str(Path(tempfile.mkdtemp(), "events.db"))
+period = 0
+latest_block = FROM_BLOCK - 1
+while latest_block < LATEST_BLOCK:
+    period += 1
+    calls = sum(rpc.calls.values())
+    result = get_events(
+        rpc, dict(requests_per_period=40, period=period), events_path=index_path
+    )
+    latest_block = result["latest_block"]
+    logger.info(
+        f"Period {period}: scanned until block {latest_block} with "
+        f"{sum(rpc.calls.values()) - calls} requests. {result.get('error', '')}"
+    )
+    assert sum(rpc.calls.values()) - calls <= 40
+    assert period < 100
+
+indexed = [event.block_number for event in query_events("ethereum")]
+logger.info(f"Indexed {len(indexed)}/{expected} events in {period} periods")
+assert len(indexed) == len(set(indexed)) == expected
+rpc.stop()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Script to check the RPC pool failover and load spreading against local mock JSON-RPC servers"""
+
+import logging
+import time
+from typing import Dict, List
+
+from aea_ledger_ethereum import EthereumApi
+from mock_rpc import MockRpcServer
+
+from packages.dvilela.contracts.olas_events.contract import OlasEventsContract
+from packages.dvilela.contracts.olas_events.scanner import unpack_events
+
+
+LATEST_BLOCK = 5_000_000
+FROM_BLOCK = 1_000_000
+EVENT_EVERY = 1000
+CONTRACTS = {"0x7e01A500805f8A52Fad229b3015AD130A332B7b3": ["Deposit"]}
+
+logging.basicConfig(level=logging.WARNING, format="%(message)s")
+logger = logging.getLogger("check_rpc_pool")
+logger.setLevel(logging.INFO)
+
+
+def scan(primary: MockRpcServer, extra: List[MockRpcServer]) -> Dict:
+    """Scan the block range like the skill does and report the time and events"""
+    start_time = time.monotonic()
+    result = OlasEventsContract.get_events(
+        EthereumApi(address=primary.url, chain_id=1),
+        list(CONTRACTS)[0],
+        CONTRACTS,
+        FROM_BLOCK,
+        LATEST_BLOCK,
+        rpc_urls=[server.url for server in extra],
+    )
+    return dict(
+        elapsed=time.monotonic() - start_time,
+        events=len(unpack_events(result["events"])),
+        latest_block=result["latest_block"],
+        error=result.get("error"),
+    )
+
+
+def start(latency: float, error_rate: float = 0.0) -> MockRpcServer:
+    """Start a mock RPC"""
+    return MockRpcServer(
+        latest_block=LATEST_BLOCK,
+        event_every=EVENT_EVERY,
+        latency=latency,
+        error_rate=error_rate,
+    ).start()
+
+
+expected = (LATEST_BLOCK - FROM_BLOCK) // EVENT_EVERY + 1
+
+# Baseline: a single slow RPC
+slow = start(latency=1.0)
+baseline = scan(slow, [])
+logger.info(f"Single RPC: {baseline}")
+
+# A pool: the same slow RPC as primary, two healthy ones, a flaky one and one that goes down
+slow = start(latency=1.0)
+fast = [start(latency=0.2), start(latency=0.2)]
+flaky = start(latency=0.2, error_rate=0.7)
+down = start(latency=0.2)
+down.stop()
+servers = {"slow": slow, "fast_1": fast[0], "fast_2": fast[1], "flaky": flaky}
+
+pooled = scan(slow, [*fast, flaky, down])
+logger.info(f"Pool: {pooled}")
+get_logs_calls = {name: server.calls["eth_getLogs"] for name, server in servers.items()}
+logger.info(f"getLogs calls per endpoint: {get_logs_calls}")
+health = OlasEventsContract.get_rpc_health(
+    EthereumApi(address=slow.url, chain_id=1),
+    list(CONTRACTS)[0],
+    rpc_urls=[server.url for server in [*fast, flaky, down]],
+)
+for endpoint in health["endpoints"]:
+    logger.info(f"  {endpoint}")
+
+assert baseline["events"] == pooled["events"] == expected, (baseline, pooled)
+assert pooled["error"] is None
+assert pooled["elapsed"] < baseline["elapsed"]
+assert health["endpoints"][-1]["open"], "The down endpoint should be skipped"
+
+for server in [slow, *fast, flaky]:
+    server.stop()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 David Vilela Freire
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""A local mock JSON-RPC server that serves synthetic contract logs"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import websockets
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic, keccak
+
+
+VEOLAS_ADDRESS = "0x7e01A500805f8A52Fad229b3015AD130A332B7b3"
+DEPOSIT_TOPIC = (
+    "0x" + keccak(text="Deposit(address,uint256,uint256,uint8,uint256)").hex()
+)
+ACCOUNT_TOPIC = "0x" + "00" * 12 + "11" * 20
+VEOLAS_DEPOSIT_LOG = {
+    "address": VEOLAS_ADDRESS,
+    "topics": [DEPOSIT_TOPIC, ACCOUNT_TOPIC],
+    "data": "0x"
+    + encode(["uint256", "uint256", "uint8", "uint256"], [10**18, 0, 1, 0]).hex(),
+}
+
+
+def build_log_source(address: str, event_abi: Dict) -> Dict:
+    """Build a synthetic log for an event, with zeroed arguments"""
+    data_types = [i["type"] for i in event_abi["inputs"] if not i["indexed"]]
+    return {
+        "address": address,
+        "topics": ["0x" + event_abi_to_log_topic(event_abi).hex()]
+        + ["0x" + "00" * 32 for i in event_abi["inputs"] if i["indexed"]],
+        "data": "0x"
+        + encode(
+            data_types,
+            [
+                [] if t.endswith("[]") else b"\0" * 32 if t == "bytes32" else 0
+                for t in data_types
+            ],
+        ).hex(),
+    }
+
+
+class MockRpcServer:  # pylint: disable=too-many-instance-attributes
+    """A JSON-RPC server that emits its logs (a veOLAS Deposit by default) every few blocks"""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        port: int = 0,
+        latest_block: int = 1_000_000,
+        event_every: int = 7000,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        filter_loss_rate: float = 0.0,
+        log_sources: Optional[List[Dict]] = None,
+        max_requests_per_second: Optional[int] = None,
+        max_block_range: Optional[int] = None,
+    ) -> None:
+        """Init"""
+        self.log_sources = log_sources or [VEOLAS_DEPOSIT_LOG]
+        self.port = port
+        self.latest_block = latest_block
+        self.event_every = event_every
+        self.latency = latency
+        self.error_rate = error_rate
+        self.filter_loss_rate = filter_loss_rate
+        self.max_requests_per_second = max_requests_per_second
+        self.max_block_range = max_block_range
+        self.throttled = 0
+        self._request_times: deque = deque()
+        self.calls: Counter = Counter()
+        self.filters: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        """Server url"""
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "MockRpcServer":
+        """Start serving in a background thread"""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler"""
+
+            def log_message(
+                self, *args: Any
+            ) -> None:  # pylint: disable=arguments-differ
+                """Silence the request log"""
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                """Handle a JSON-RPC request"""
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                if mock.is_throttled():
+                    self.send_response(429)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                requests = request if isinstance(request, list) else [request]
+                responses = [mock.handle(r) for r in requests]
+                body = json.dumps(
+                    responses if isinstance(request, list) else responses[0]
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def is_throttled(self) -> bool:
+        """Check whether a new request goes over the requests per second, as public RPCs do"""
+        if self.max_requests_per_second is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] > 1:
+                self._request_times.popleft()
+            if len(self._request_times) >= self.max_requests_per_second:
+                self.throttled += 1
+                return True
+            self._request_times.append(now)
+            return False
+
+    def get_logs(self, params: Dict) -> List[Dict]:
+        """Build the logs between two blocks that match the address and topic filters"""
+        from_block, to_block = int(params["fromBlock"], 16), int(params["toBlock"], 16)
+        addresses = params.get("address") or []
+        addresses = {
+            a.lower()
+            for a in ([addresses] if isinstance(addresses, str) else addresses)
+        }
+        topics = (params.get("topics") or [None])[0]
+        topics = {topics} if isinstance(topics, str) else set(topics or [])
+        sources = [
+            source
+            for source in self.log_sources
+            if (not addresses or source["address"].lower() in addresses)
+            and (not topics or source["topics"][0] in topics)
+        ]
+        first = from_block + (-from_block % self.event_every)
+        return [
+            {
+                **source,
+                "blockNumber": hex(block),
+                "blockHash": "0x" + "cd" * 32,
+                "logIndex": hex(log_index),
+                "transactionIndex": "0x0",
+                "transactionHash": "0x" + block.to_bytes(32, "big").hex(),
+                "removed": False,
+            }
+            for block in range(first, to_block + 1, self.event_every)
+            for log_index, source in enumerate(sources)
+        ]
+
+    def handle(self, request: Dict) -> Dict:
+        """Handle a single JSON-RPC call"""
+        method, params = request["method"], request.get("params", [])
+        with self._lock:
+            self.calls[method] += 1
+
+        time.sleep(self.latency)
+        response: Dict[str, Any] = {"jsonrpc": "2.0", "id": request["id"]}
+
+        if random.random() < self.error_rate:  # nosec
+            response["error"] = {"code": -32000, "message": "internal error"}
+            return response
+
+        if method == "eth_chainId":
+            response["result"] = "0x1"
+        elif method == "eth_blockNumber":
+            response["result"] = hex(self.latest_block)
+        elif method == "eth_getLogs":
+            n_blocks = int(params[0]["toBlock"], 16) - int(params[0]["fromBlock"], 16)
+            if self.max_block_range is not None and n_blocks >= self.max_block_range:
+                response["error"] = {
+                    "code": -32000,
+                    "message": f"block range is too large, max is {self.max_block_range}",
+                }
+            else:
+                response["result"] = self.get_logs(params[0])
+        elif method == "eth_newFilter":
+            filter_id = hex(random.getrandbits(64))  # nosec
+            with self._lock:
+                self.filters[filter_id] = params[0]
+            response["result"] = filter_id
+        elif method in ("eth_getFilterLogs", "eth_getFilterChanges"):
+            filter_params = self.filters.get(params[0])
+            if (
+                filter_params is None or random.random() < self.filter_loss_rate
+            ):  # nosec
+                response["error"] = {
+                    "code": -32000,
+                    "message": f"Filter with id: {params[0]} does not exist",
+                }
+            else:
+                response["result"] = self.get_logs(filter_params)
+        elif method == "eth_uninstallFilter":
+            with self._lock:
+                response["result"] = self.filters.pop(params[0], None) is not None
+        else:
+            response["error"] = {"code": -32601, "message": "method not found"}
+
+        return response
+
+
+class MockWsRpcServer:  # pylint: disable=too-many-instance-attributes
+    """
+    A websocket JSON-RPC server that mines a block every few seconds on top of a MockRpcServer.
+
+    Subscribers get the newHeads and the logs of every new block. The logs are the same
+    ones the http server returns for eth_getLogs, so range scans and streams agree.
+    """
+
+    def __init__(
+        self, rpc: MockRpcServer, block_time: float = 1.0, port: int = 0
+    ) -> None:
+        """Init"""
+        self.rpc = rpc
+        self.block_time = block_time
+        self.port = port
+        self.mined_at: Dict[int, float] = {}
+        self._subscribers: Dict[Any, Dict[str, Dict]] = {}
+        self._loop = asyncio.new_event_loop()
+        self._stopped = threading.Event()
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        """Server url"""
+        return f"ws://127.0.0.1:{self.port}"
+
+    def start(self) -> "MockWsRpcServer":
+        """Start serving and mining in a background thread"""
+        threading.Thread(
+            target=self._loop.run_until_complete, args=(self._serve(),), daemon=True
+        ).start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving"""
+        self._stopped.set()
+
+    def drop_connections(self) -> None:
+        """Close every subscriber connection, as a flaky RPC would"""
+        for ws in list(self._subscribers):
+            asyncio.run_coroutine_threadsafe(ws.close(), self._loop)
+
+    async def _serve(self) -> None:
+        """Serve subscriptions and mine blocks until stopped"""
+        async with websockets.serve(self._handle, "127.0.0.1", self.port) as server:
+            self.port = list(server.sockets)[0].getsockname()[1]
+            self._ready.set()
+            while not self._stopped.is_set():
+                await asyncio.sleep(self.block_time)
+                await self._mine()
+
+    async def _handle(self, ws: Any) -> None:
+        """Handle the eth_subscribe requests of a connection"""
+        self._subscribers[ws] = {}
+        try:
+            async for message in ws:
+                request = json.loads(message)
+                subscription_id = hex(random.getrandbits(64))  # nosec
+                kind, *params = request["params"]
+                self._subscribers[ws][subscription_id] = {
+                    "kind": kind,
+                    "filter": params[0] if params else {},
+                }
+                await ws.send(
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": request["id"],
+                            "result": subscription_id,
+                        }
+                    )
+                )
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._subscribers.pop(ws, None)
+
+    async def _mine(self) -> None:
+        """Mine a block and notify its logs and head to every subscriber"""
+        self.rpc.latest_block += 1
+        block = self.rpc.latest_block
+        self.mined_at[block] = time.monotonic()
+        for ws, subscriptions in list(self._subscribers.items()):
+            for subscription_id, subscription in subscriptions.items():
+                if subscription["kind"] == "logs":
+                    results = self.rpc.get_logs(
+                        {
+                            **subscription["filter"],
+                            "fromBlock": hex(block),
+                            "toBlock": hex(block),
+                        }
+                    )
+                else:
+                    results = [{"number": hex(block), "hash": "0x" + "cd" * 32}]
+                for result in results:
+                    try:
+                        await ws.send(
+                            json.dumps(
+                                {
+                                    "jsonrpc": "2.0",
+                                    "method": "eth_subscription",
+                                    "params": {
+                                        "subscription": subscription_id,
+                                        "result": result,
+                                    },
+                                }
+                            )
+                        )
+                    except websockets.exceptions.ConnectionClosed:
+                        break